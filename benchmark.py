@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from aiohttp import web
+
+import neurlps
+
+ROOT = Path(__file__).resolve().parent
+
+
+# ---------------------------------------------------------------------------
+# Synthetic papers.nips.cc
+# ---------------------------------------------------------------------------
+
+def paper_hash(year, index):
+    return f"{year:04d}{index:028x}"
+
+
+def build_mock_site(years, papers_per_year, pdf_size, abstract_size, latency, error_rate, seed):
+    # Pages mirror the markup of papers.nips.cc closely enough for every parser backend
+    rng = random.Random(seed)
+    pdf_body = (b"%PDF-1.4\n" + bytes(rng.getrandbits(8) for _ in range(1024)) * (pdf_size // 1024 + 1))[:pdf_size]
+    abstract_text = ("lorem ipsum dolor sit amet " * (abstract_size // 27 + 1))[:abstract_size]
+
+    def page(body):
+        return web.Response(text=f"<!doctype html><html><body><div class=\"container-fluid\"><div class=\"col\">"
+                                 f"{body}</div></div></body></html>", content_type="text/html")
+
+    error_rng = random.Random(seed)
+
+    @web.middleware
+    async def network(request, handler):
+        if latency:
+            await asyncio.sleep(latency)
+        # Errors are injected on the high-volume abstract and PDF requests only, so a run always has work to do
+        if error_rate and ("/hash/" in request.path or "/file/" in request.path):
+            if error_rng.random() < error_rate:
+                return web.Response(status=503, headers={"Retry-After": "1"})
+        return await handler(request)
+
+    async def index(request):
+        links = "".join(f"<li><a href=\"/paper_files/paper/{year}\">NeurIPS {year}</a></li>" for year in years)
+        return page(f"<ul>{links}</ul>")
+
+    async def year_page(request):
+        year = int(request.match_info["year"])
+        items = "".join(
+            f"<li class=\"none\"><a title=\"paper title\" href=\"/paper_files/paper/{year}/hash/"
+            f"{paper_hash(year, index)}-Abstract.html\">Synthetic paper {year} number {index}</a> "
+            f"<i>Author One, Author Two, Author {index}</i></li>"
+            for index in range(papers_per_year))
+        return page(f"<h4>NeurIPS {year}</h4><ul class=\"paper-list\">{items}</ul>")
+
+    async def abstract_page(request):
+        return page(f"<h4>Synthetic paper</h4><p>Part of Advances</p><p><i>Author One</i></p>"
+                    f"<p>{abstract_text}</p>")
+
+    async def pdf(request):
+        return web.Response(body=pdf_body, content_type="application/pdf")
+
+    app = web.Application(middlewares=[network])
+    app.router.add_get("/", index)
+    app.router.add_get("/paper_files/paper/{year}", year_page)
+    app.router.add_get("/paper_files/paper/{year}/hash/{hash}-Abstract.html", abstract_page)
+    app.router.add_get("/paper_files/paper/{year}/file/{hash}-Paper.pdf", pdf)
+    return app
+
+
+def serve_mock_site(port, site_options):
+    # Runs in its own process so server CPU and memory never show up in the scraper's numbers
+    web.run_app(build_mock_site(**site_options), host="127.0.0.1", port=port, print=None, access_log=None)
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Mock server did not start on port {port}")
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------------
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.cpu_time = 0.0
+        self.wall_time = 0.0
+
+    def as_dict(self):
+        return {"calls": self.calls, "cpu_seconds": round(self.cpu_time, 4), "wall_seconds": round(self.wall_time, 4)}
+
+
+class TimedCoroutine:
+    # Charges the CPU time of every step of the wrapped coroutine to one stage; time spent suspended is not counted
+    def __init__(self, coroutine, stats: StageStats):
+        self.coroutine = coroutine
+        self.stats = stats
+
+    def __await__(self):
+        iterator = self.coroutine.__await__()
+        send, message = iterator.send, None
+        self.stats.calls += 1
+        started_wall = time.perf_counter()
+        try:
+            while True:
+                started = time.thread_time()
+                try:
+                    signal = send(message)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    self.stats.cpu_time += time.thread_time() - started
+                try:
+                    message = yield signal
+                    send = iterator.send
+                except BaseException as exc:
+                    send, message = iterator.throw, exc
+        finally:
+            self.stats.wall_time += time.perf_counter() - started_wall
+
+
+def instrument(target, method_name, stats: StageStats):
+    method = getattr(target, method_name)
+
+    def timed(*args, **kwargs):
+        return TimedCoroutine(method(*args, **kwargs), stats)
+
+    setattr(target, method_name, timed)
+
+
+async def sample_loop_lag(samples, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Benchmark run
+# ---------------------------------------------------------------------------
+
+def build_scrapper(base_url, work_directory, args):
+    metadata_directory = os.path.join(work_directory, "metadata")
+    metadata_storage = neurlps.MetadataStorage(os.path.join(metadata_directory, "papers_metadata.csv"),
+                                               backend=args.metadata_format)
+    manifest = neurlps.DownloadManifest(os.path.join(metadata_directory, "manifest.sqlite"))
+    http_cache = neurlps.HttpCache(os.path.join(metadata_directory, "http_cache.sqlite")) if args.http_cache else None
+    limiter = neurlps.AdaptiveLimiter(initial_limit=args.concurrency, max_limit=args.max_concurrency)
+    return neurlps.NipsScrapper(base_url, os.path.join(work_directory, "downloaded_papers"), limiter,
+                                neurlps.ProgressTracker(limiter=limiter), metadata_storage, manifest=manifest,
+                                http_cache=http_cache, parser=args.parser or neurlps.DEFAULT_PARSER,
+                                download_workers=args.max_concurrency, layout=args.layout,
+                                fetch_abstracts=args.abstracts, requests_per_second=args.requests_per_second,
+                                bytes_per_second=args.bandwidth)
+
+
+async def run_scrapper(scrapper, start_year, end_year):
+    stages = {}
+    targets = {
+        "year_listing": (scrapper, "extract_year_links"),
+        "paper_listing": (scrapper, "extract_paper_links"),
+        "abstract": (scrapper, "get_paper_abstract"),
+        "download": (scrapper, "download_paper"),
+        "metadata": (scrapper.metadata_storage, "save_paper_metadata"),
+    }
+    for stage, (target, method_name) in targets.items():
+        if hasattr(target, method_name):
+            stages[stage] = StageStats()
+            instrument(target, method_name, stages[stage])
+
+    lag_samples = []
+    lag_task = asyncio.create_task(sample_loop_lag(lag_samples))
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    try:
+        await scrapper.download_papers_from_year_range(start_year, end_year)
+    finally:
+        elapsed = time.perf_counter() - started
+        cpu_time = time.process_time() - cpu_started
+        lag_task.cancel()
+    return elapsed, cpu_time, stages, lag_samples
+
+
+def stored_pdfs(directory):
+    # Regular PDF files under the download directory; the hashed layout's by-title symlinks are not counted
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(".pdf") and not os.path.islink(path):
+                yield path
+
+
+def run_benchmark(args):
+    years = list(range(args.first_year + args.years - 1, args.first_year - 1, -1))
+    site_options = {
+        "years": years,
+        "papers_per_year": args.papers_per_year,
+        "pdf_size": args.pdf_size,
+        "abstract_size": args.abstract_size,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "seed": args.seed,
+    }
+    port = get_free_port()
+    server = multiprocessing.Process(target=serve_mock_site, args=(port, site_options), daemon=True)
+    server.start()
+    try:
+        wait_for_port(port)
+        with tempfile.TemporaryDirectory(prefix="neurlps-bench-") as work_directory:
+            async def main():
+                scrapper = build_scrapper(f"http://127.0.0.1:{port}", work_directory, args)
+                try:
+                    run = await run_scrapper(scrapper, min(years), max(years))
+                finally:
+                    await scrapper.close()
+                return (*run, {**scrapper.limiter.metrics(), "requests": scrapper.request_bucket.metrics(),
+                                "bandwidth": scrapper.byte_bucket.metrics()})
+
+            # Progress output is part of the measured work, but is not worth printing here
+            with open(os.devnull, "w") as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    elapsed, cpu_time, stages, lag_samples, limiter_metrics = asyncio.run(main())
+                finally:
+                    sys.stdout = stdout
+            pdf_paths = list(stored_pdfs(os.path.join(work_directory, "downloaded_papers")))
+            downloaded_bytes = sum(os.path.getsize(path) for path in pdf_paths)
+            papers = len(pdf_paths)
+    finally:
+        server.terminate()
+        server.join()
+
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {**{key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+                   "years": len(years)},
+        "results": {
+            "papers": papers,
+            "expected_papers": len(years) * args.papers_per_year,
+            "elapsed_seconds": round(elapsed, 4),
+            "papers_per_sec": round(papers / elapsed, 2) if elapsed else 0.0,
+            "mb_per_sec": round(downloaded_bytes / (1024 * 1024) / elapsed, 2) if elapsed else 0.0,
+            "downloaded_mb": round(downloaded_bytes / (1024 * 1024), 2),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "cpu_seconds": round(cpu_time, 4),
+            "loop_lag_ms": {
+                "mean": round(statistics.fmean(lag_samples) * 1000, 3) if lag_samples else 0.0,
+                "p99": round(percentile(lag_samples, 0.99) * 1000, 3),
+                "max": round(max(lag_samples, default=0.0) * 1000, 3),
+            },
+            "stages": {stage: stats.as_dict() for stage, stats in stages.items()},
+            "limiter": limiter_metrics,
+        },
+    }
+
+
+def compare(report, baseline_file):
+    with open(baseline_file, encoding="utf-8") as file:
+        baseline = json.load(file)["results"]
+    print(f"Compared with {baseline_file}:")
+    for metric in ("papers_per_sec", "mb_per_sec", "peak_rss_mb", "cpu_seconds"):
+        before, after = baseline.get(metric), report["results"][metric]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"  {metric:>16}: {before} -> {after} ({change})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the scraper end to end against a local mock papers.nips.cc")
+    parser.add_argument("--abstracts", action="store_true", help="also fetch every paper's abstract page")
+    parser.add_argument("--years", type=int, default=3, help="number of synthetic years")
+    parser.add_argument("--first-year", type=int, default=1987)
+    parser.add_argument("--papers-per-year", type=int, default=200)
+    parser.add_argument("--pdf-size", type=int, default=256 * 1024, help="bytes per synthetic PDF")
+    parser.add_argument("--abstract-size", type=int, default=1500, help="characters per abstract")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds of server latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of abstract/PDF requests answered with 503")
+    parser.add_argument("--concurrency", type=int, default=10, help="initial download concurrency")
+    parser.add_argument("--max-concurrency", type=int, default=100, help="upper bound for the adaptive limiter")
+    parser.add_argument("--requests-per-second", type=float, help="request rate cap (default: unlimited)")
+    parser.add_argument("--bandwidth", type=neurlps.utils.parse_bytes, help="PDF bytes/sec cap, e.g. 5MB")
+    parser.add_argument("--parser", choices=["lxml", "bs4"], default=None, help="HTML parser backend")
+    parser.add_argument("--metadata-format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--http-cache", action="store_true", help="route pages through the on-disk HTTP cache")
+    parser.add_argument("--layout", choices=["flat", "hashed"], default="flat", help="PDF store layout")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the JSON report")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
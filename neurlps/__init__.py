@@ -0,0 +1,25 @@
+# Core engine shared by the CLI and the Streamlit frontend. Importing it only pulls in the crawl dependencies
+# (aiohttp, aiofiles, bs4 and optionally lxml); pyarrow, pypdf and zstandard are loaded on demand by the Parquet
+# backend, text extraction and the archive export.
+from .export import ShardIndex, export_archives
+from .extraction import TextExtractor
+from .network import (AdaptiveLimiter, ByteBudget, CacheMissError, HttpCache, check_network_availability,
+                      create_session)
+from .parsers import DEFAULT_PARSER, parse_abstract, parse_paper_links, parse_year_links
+from .progress import ProgressTracker
+from .scraper import BASE_URL, NipsScrapper, iter_papers, open_scraper
+from .search import SearchIndex
+from .sharding import QueueMetadataStorage, WorkQueue, run_sharded_crawl
+from .storage import (ContentAddressedStore, CsvBackend, DownloadManifest, FlatLayout, MetadataFileError,
+                      MetadataStorage, ParquetBackend, TextStore, YearSnapshots)
+from .telemetry import Telemetry
+from .utils import create_directory, get_paper_hash, sanitize_filename
+
+__all__ = [
+    'AdaptiveLimiter', 'BASE_URL', 'ByteBudget', 'CacheMissError', 'ContentAddressedStore', 'CsvBackend',
+    'DEFAULT_PARSER', 'DownloadManifest', 'FlatLayout', 'HttpCache', 'MetadataFileError', 'MetadataStorage',
+    'NipsScrapper', 'ParquetBackend', 'ProgressTracker', 'QueueMetadataStorage', 'SearchIndex', 'ShardIndex',
+    'Telemetry', 'TextExtractor', 'TextStore', 'WorkQueue', 'YearSnapshots', 'check_network_availability',
+    'create_directory', 'create_session', 'export_archives', 'get_paper_hash', 'iter_papers', 'open_scraper',
+    'parse_abstract', 'parse_paper_links', 'parse_year_links', 'run_sharded_crawl', 'sanitize_filename',
+]
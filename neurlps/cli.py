@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import time
+
+from .export import export_archives
+from .parsers import DEFAULT_PARSER
+from .search import SearchIndex
+from .scraper import BASE_URL, open_scraper
+from .sharding import run_sharded_crawl
+from .storage import MetadataFileError
+from .telemetry import Telemetry
+from .utils import format_bytes, parse_bytes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="neurlps", description="Download NeurIPS papers and their metadata")
+    parser.add_argument("--start-year", type=int, help="first year to fetch (default: oldest available)")
+    parser.add_argument("--end-year", type=int, help="last year to fetch (default: newest available)")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--download-dir", default="./downloaded_papers", help="where PDFs are stored")
+    parser.add_argument("--metadata-dir", default="./metadata",
+                        help="metadata, manifest, page cache, sync snapshots and changelog")
+    parser.add_argument("--metadata-format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--layout", choices=["flat", "hashed"], default="flat",
+                        help="'hashed' stores PDFs by NeurIPS hash with deduplication and by-title symlinks")
+    parser.add_argument("--verify-pdfs", action="store_true",
+                        help="re-hash completed PDFs before skipping them (reads the whole archive on every run)")
+    parser.add_argument("--concurrency", type=int, default=10, help="initial number of parallel downloads")
+    parser.add_argument("--max-concurrency", type=int, default=100, help="upper bound for the adaptive limiter")
+    parser.add_argument("--requests-per-second", type=float,
+                        help="cap on HTTP requests per second across all stages (default: unlimited)")
+    parser.add_argument("--bandwidth", type=parse_bytes,
+                        help="cap on PDF download bytes per second, e.g. 5MB (default: unlimited)")
+    parser.add_argument("--priority", choices=["newest", "oldest", "listing"], default="newest",
+                        help="which years are listed and downloaded first")
+    parser.add_argument("--ignore-robots", action="store_true", help="do not slow down to robots.txt Crawl-delay")
+    parser.add_argument("--abstracts", action="store_true",
+                        help="also fetch each paper's abstract page (always on with --metadata-only)")
+    parser.add_argument("--abstract-workers", type=int,
+                        help="parallel abstract page fetches (default: 16, or --max-concurrency with --metadata-only)")
+    parser.add_argument("--parser", choices=["lxml", "bs4"], default=DEFAULT_PARSER, help="HTML parser backend")
+    parser.add_argument("--offline", action="store_true", help="answer every page from the cache, never the network")
+    parser.add_argument("--sync", action="store_true", help="only fetch papers new or changed since the last sync")
+    parser.add_argument("--metadata-only", action="store_true",
+                        help="record titles, authors and abstracts without downloading PDFs")
+    parser.add_argument("--probe-pdfs", action="store_true",
+                        help="with --metadata-only, send a HEAD request per PDF to record its size and availability")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="list what would be fetched without downloading or recording anything")
+    parser.add_argument("--extract-text", action="store_true",
+                        help="extract the text of every downloaded PDF into <metadata-dir>/fulltext.sqlite (needs pypdf)")
+    parser.add_argument("--extract-workers", type=int, help="text extraction processes (default: CPU count)")
+    parser.add_argument("--shard-queue", help="shared work queue file; splits the crawl across processes and hosts")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="shard processes on this host (at most --concurrency; the limits are split across them)")
+    parser.add_argument("--no-index", action="store_true",
+                        help="do not update the search index (<metadata-dir>/search.sqlite, see the search command)")
+    parser.add_argument("--trace-log", help="append a JSON line per HTTP request and pipeline stage to this file")
+    parser.add_argument("--metrics-file", help="keep Prometheus text metrics (stage histograms, loop lag) in this file")
+    parser.add_argument("--metrics-port", type=int, help="serve the Prometheus metrics on http://0.0.0.0:PORT/metrics")
+    parser.add_argument("--quiet", action="store_true", help="no progress line")
+    args = parser.parse_args(argv)
+    if args.shard_queue and (args.sync or args.metadata_only or args.dry_run or args.abstracts):
+        parser.error("--shard-queue cannot be combined with --sync, --metadata-only, --dry-run or --abstracts")
+    if args.metadata_only and args.dry_run:
+        parser.error("--metadata-only and --dry-run are mutually exclusive")
+    if args.probe_pdfs and not args.metadata_only:
+        parser.error("--probe-pdfs requires --metadata-only")
+    if args.extract_text and (args.shard_queue or args.metadata_only or args.dry_run):
+        parser.error("--extract-text cannot be combined with --shard-queue, --metadata-only or --dry-run")
+    return args
+
+
+def print_telemetry_summary(telemetry):
+    # One line per histogram: pipeline stages, HTTP phases per request kind and event-loop lag
+    print(f"\n{'timing':<40} {'count':>8} {'mean ms':>10} {'p99 ms':>10}")
+    for name, stats in telemetry.summary().items():
+        print(f"{name:<40} {stats['count']:>8} {stats['mean'] * 1000:>10.1f} {stats['p99'] * 1000:>10.1f}")
+
+
+async def run(args) -> int:
+    # Tracing and metrics are only wired in when one of their outputs is requested
+    telemetry = None
+    if args.trace_log or args.metrics_file or args.metrics_port:
+        telemetry = Telemetry(log_file=args.trace_log, metrics_file=args.metrics_file, metrics_port=args.metrics_port)
+    try:
+        async with open_scraper(args.download_dir, args.metadata_dir, args.base_url, args.metadata_format,
+                                args.concurrency, args.max_concurrency, progress=not (args.quiet or args.dry_run),
+                                extract_text=args.extract_text, extract_workers=args.extract_workers,
+                                index=not args.no_index, offline=args.offline, abstract_workers=args.abstract_workers,
+                                parser=args.parser, layout=args.layout, fetch_abstracts=args.abstracts,
+                                probe_pdfs=args.probe_pdfs, requests_per_second=args.requests_per_second,
+                                bytes_per_second=args.bandwidth, priority=args.priority,
+                                respect_robots=not args.ignore_robots, verify_pdfs=args.verify_pdfs,
+                                telemetry=telemetry) as nips_scrapper:
+            if telemetry is not None:
+                await telemetry.start()
+            return await crawl(args, nips_scrapper, telemetry)
+    except MetadataFileError as e:
+        print(e)
+        return 2
+    finally:
+        if telemetry is not None:
+            await telemetry.stop()
+
+
+async def crawl(args, nips_scrapper, telemetry=None) -> int:
+    progress_tracker = nips_scrapper.progress_tracker
+    years = await nips_scrapper.get_max_min_year()
+    if years is None:
+        where = "the offline cache" if args.offline else args.base_url
+        print(f"Could not read the list of years from {where}")
+        return 1
+    max_year, min_year = years
+    start_year = min_year if args.start_year is None else args.start_year
+    end_year = max_year if args.end_year is None else args.end_year
+    if start_year > end_year or start_year > max_year or end_year < min_year:
+        print(f"Please Enter Year between {min_year} and {max_year}")
+        return 2
+    if args.shard_queue:
+        unfinished = await run_sharded_crawl(nips_scrapper, args.shard_queue, args.processes, start_year, end_year,
+                                             nips_scrapper.metadata_storage, args.layout, args.max_concurrency,
+                                             args.concurrency)
+        return 1 if unfinished else 0
+    pending = recorded = unavailable = pdf_bytes = 0
+    text_statuses = {"extracted": 0, "cached": 0, "failed": 0}
+    async for record in nips_scrapper.iter_papers(start_year, end_year, sync=args.sync,
+                                                  metadata_only=args.metadata_only, dry_run=args.dry_run):
+        if args.dry_run:
+            pending += record["status"] == "pending"
+            print(f"{record['status']:>8}  {record['year']}  {record['paper_name']}")
+        recorded += record["status"] == "recorded"
+        unavailable += record["pdf_available"] is False
+        pdf_bytes += record["pdf_size"] or 0
+        if record["text_status"]:
+            text_statuses[record["text_status"]] += 1
+    if args.dry_run:
+        print(f"{pending} of {progress_tracker.total_papers} papers would be downloaded")
+    if args.metadata_only:
+        summary = f"\nMetadata: {recorded} new of {progress_tracker.total_papers} papers"
+        if args.probe_pdfs:
+            summary += f", {unavailable} PDFs unavailable, {format_bytes(pdf_bytes)} of PDFs listed"
+        print(summary)
+    if args.extract_text:
+        print(f"\nText: {text_statuses['extracted']} extracted, {text_statuses['cached']} unchanged, "
+              f"{text_statuses['failed']} failed")
+    if args.sync:
+        changes = [change for _, changes in nips_scrapper.sync_changes.values() for change in changes]
+        print(f"\nSync finished: {sum(change['change'] == 'added' for change in changes)} added, "
+              f"{sum(change['change'] == 'changed' for change in changes)} changed, "
+              f"{sum(change['change'] == 'removed' for change in changes)} removed")
+    if telemetry is not None and not args.quiet:
+        print_telemetry_summary(telemetry)
+    # A non-zero exit lets cron and job schedulers notice failed downloads
+    return 1 if progress_tracker.failed_papers else 0
+
+
+def search_main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="neurlps search", description="Search downloaded NeurIPS paper metadata")
+    parser.add_argument("query", nargs="?", help="words to search for in titles, authors, abstracts and texts")
+    parser.add_argument("--metadata-dir", default="./metadata")
+    parser.add_argument("--year", help="only papers from this year")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--raw", action="store_true", help="treat the query as FTS5 syntax (e.g. 'title:graph OR gnn')")
+    parser.add_argument("--update", action="store_true",
+                        help="index papers_metadata.csv and fulltext.sqlite first (for metadata from older runs)")
+    args = parser.parse_args(argv)
+    if not args.query and not args.update:
+        parser.error("a query or --update is required")
+
+    search_index = SearchIndex(os.path.join(args.metadata_dir, 'search.sqlite'))
+    try:
+        if args.update:
+            metadata_file = os.path.join(args.metadata_dir, 'papers_metadata.csv')
+            indexed = 0
+            if os.path.exists(metadata_file) or os.path.isdir(os.path.splitext(metadata_file)[0]):
+                indexed = search_index.index_metadata(metadata_file)
+            texts = search_index.index_texts(os.path.join(args.metadata_dir, 'fulltext.sqlite'))
+            print(f"Indexed {indexed} metadata rows and {texts} texts; {search_index.count()} papers in the index")
+        if not args.query:
+            return 0
+        started = time.perf_counter()
+        try:
+            results = search_index.search(args.query, limit=args.limit, year=args.year, raw=args.raw)
+        except sqlite3.OperationalError as e:
+            print(f"Invalid query: {e}")
+            return 2
+        elapsed = time.perf_counter() - started
+        for rank, result in enumerate(results, 1):
+            print(f"{rank:>3}. {result['title']} ({result['year']})")
+            print(f"     {result['author']}")
+            print(f"     {result['snippet']}")
+            if result['pdf_link']:
+                print(f"     {result['pdf_link']}")
+        print(f"{len(results)} results in {elapsed * 1000:.1f} ms")
+        return 0
+    finally:
+        search_index.close()
+
+
+def export_main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="neurlps export",
+                                     description="Bundle downloaded PDFs and metadata into sharded tar archives")
+    parser.add_argument("--metadata-dir", default="./metadata", help="metadata and manifest of the crawl to export")
+    parser.add_argument("--output", default="./export", help="where shards and index.sqlite are written")
+    parser.add_argument("--start-year", type=int, help="first year to export (default: oldest downloaded)")
+    parser.add_argument("--end-year", type=int, help="last year to export (default: newest downloaded)")
+    parser.add_argument("--shard-size", type=parse_bytes, default=parse_bytes("1GB"),
+                        help="target size of the PDFs in one shard, e.g. 500MB (default: 1GB)")
+    parser.add_argument("--max-papers", type=int, help="papers per shard at most")
+    parser.add_argument("--compression", choices=["zstd", "none"], default="zstd",
+                        help="zstd needs the zstandard package")
+    parser.add_argument("--level", type=int, default=3, help="zstd compression level")
+    parser.add_argument("--workers", type=int, help="shards written in parallel (default: CPU count)")
+    args = parser.parse_args(argv)
+    if not os.path.exists(os.path.join(args.metadata_dir, 'manifest.sqlite')):
+        parser.error(f"no download manifest in {args.metadata_dir}")
+
+    started = time.perf_counter()
+    summary = export_archives(args.metadata_dir, args.output, args.start_year, args.end_year,
+                              shard_size=args.shard_size, max_papers=args.max_papers,
+                              compression=None if args.compression == "none" else args.compression,
+                              level=args.level, max_workers=args.workers)
+    elapsed = time.perf_counter() - started
+    for url in summary["missing"]:
+        print(f"Missing on disk, not exported: {url}")
+    print(f"Exported {summary['papers']} papers from {summary['years']} years into {summary['shards']} shards: "
+          f"{format_bytes(summary['bytes'])} -> {format_bytes(summary['compressed_bytes'])} in {elapsed:.1f}s")
+    return 1 if summary["missing"] else 0
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # `neurlps search ...` queries the local index, `neurlps export ...` archives a crawl; everything else is a crawl
+    if argv[:1] == ["search"]:
+        return search_main(argv[1:])
+    if argv[:1] == ["export"]:
+        return export_main(argv[1:])
+    return asyncio.run(run(parse_args(argv)))
@@ -0,0 +1,275 @@
+import hashlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import sqlite3
+import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .storage import DownloadManifest, read_metadata_batches
+from .utils import create_directory, get_paper_hash
+
+COPY_CHUNK_SIZE = 1024 * 1024
+TAR_BLOCK_SIZE = 512
+
+
+class _CountingFile:
+    # Write-only file wrapper that tracks the position and the SHA-256 of everything written through it
+    def __init__(self, file):
+        self.file = file
+        self.position = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.file.write(data)
+        self.digest.update(data)
+        self.position += len(data)
+        return len(data)
+
+    def flush(self):
+        self.file.flush()
+
+
+def _write_member(sink, name, size, source, mtime) -> int:
+    # One tar member streamed from source in bounded chunks; the header comes from tarfile so any tar reader accepts
+    # it. Returns the uncompressed bytes written
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    header = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+    sink.write(header)
+    remaining = size
+    while remaining:
+        chunk = source.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise OSError(f"{name} shrank while it was being archived")
+        sink.write(chunk)
+        remaining -= len(chunk)
+    sink.write(b'\0' * (-size % TAR_BLOCK_SIZE))
+    return len(header) + size + (-size % TAR_BLOCK_SIZE)
+
+
+def write_shard(shard_path, papers, compression='zstd', level=3):
+    # Runs in a worker process. Writes one WebDataset-style tar shard (<paper_hash>.json + <paper_hash>.pdf per paper)
+    # with every paper in its own zstd frame: the shard is still one ordinary .tar.zst, and the (offset, length) of a
+    # frame in the shard index is enough to decompress a single paper
+    part_path = shard_path + '.part'
+    entries, missing, tar_bytes = [], [], 0
+    with open(part_path, 'wb') as file:
+        output = _CountingFile(file)
+        if compression == 'zstd':
+            import zstandard
+            sink = zstandard.ZstdCompressor(level=level).stream_writer(output, closefd=False)
+        else:
+            sink = output
+        for paper in papers:
+            try:
+                source = open(paper["file_path"], 'rb')
+            except OSError:
+                missing.append(paper["url"])
+                continue
+            with source:
+                pdf_bytes = os.fstat(source.fileno()).st_size
+                metadata = json.dumps(paper["metadata"], ensure_ascii=False).encode('utf-8')
+                mtime = int(paper["updated_at"] or time.time())
+                offset = output.position
+                tar_bytes += _write_member(sink, paper["paper_hash"] + '.json', len(metadata), io.BytesIO(metadata),
+                                           mtime)
+                tar_bytes += _write_member(sink, paper["paper_hash"] + '.pdf', pdf_bytes, source, mtime)
+            if compression == 'zstd':
+                sink.flush(zstandard.FLUSH_FRAME)
+            entries.append({"paper_hash": paper["paper_hash"], "year": paper["year"],
+                            "title": paper["metadata"].get("paper_name"), "offset": offset,
+                            "length": output.position - offset, "pdf_bytes": pdf_bytes, "sha256": paper["sha256"]})
+        # End-of-archive marker, in the last frame
+        sink.write(b'\0' * (2 * TAR_BLOCK_SIZE))
+        if compression == 'zstd':
+            sink.close()
+        file.flush()
+        os.fsync(file.fileno())
+    # Only complete shards ever appear under the final name, and a shard whose PDFs all vanished never replaces one
+    # from an earlier export
+    if entries:
+        os.replace(part_path, shard_path)
+    else:
+        os.remove(part_path)
+    return {"name": os.path.basename(shard_path), "papers": len(entries), "bytes": tar_bytes + 2 * TAR_BLOCK_SIZE,
+            "compressed_bytes": output.position, "sha256": output.digest.hexdigest(), "entries": entries,
+            "missing": missing}
+
+
+def plan_shards(papers, shard_size, max_papers=None):
+    # Consecutive papers are grouped until the next PDF would push the shard past shard_size bytes (or max_papers)
+    shards, current, current_bytes = [], [], 0
+    for paper in papers:
+        if current and (current_bytes + paper["bytes"] > shard_size or (max_papers and len(current) >= max_papers)):
+            shards.append(current)
+            current, current_bytes = [], 0
+        current.append(paper)
+        current_bytes += paper["bytes"]
+    if current:
+        shards.append(current)
+    return shards
+
+
+class ShardIndex:
+    # index.sqlite next to the shards: which shard holds a paper and where its frame starts, so consumers can read
+    # a single paper with one seek instead of decompressing a whole shard
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.directory = os.path.dirname(os.path.abspath(db_file))
+        create_directory(self.directory)
+        self.connection = sqlite3.connect(db_file)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS shards (
+                name TEXT PRIMARY KEY,
+                year TEXT NOT NULL,
+                papers INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                compressed_bytes INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                created_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS papers (
+                paper_hash TEXT PRIMARY KEY,
+                year TEXT,
+                title TEXT,
+                shard TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                pdf_bytes INTEGER NOT NULL,
+                sha256 TEXT
+            );
+            CREATE INDEX IF NOT EXISTS papers_year ON papers (year);
+        """)
+        self.connection.commit()
+
+    def shard_names(self, year):
+        return [row[0] for row in self.connection.execute("SELECT name FROM shards WHERE year = ?", (str(year),))]
+
+    def replace_year(self, year, shards):
+        # A year's shards are always rebuilt together, so its old rows are replaced in one transaction
+        with self.connection:
+            self.connection.execute("DELETE FROM shards WHERE year = ?", (str(year),))
+            self.connection.execute("DELETE FROM papers WHERE year = ?", (str(year),))
+            self.connection.executemany(
+                "INSERT INTO shards (name, year, papers, bytes, compressed_bytes, sha256, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(shard["name"], str(year), shard["papers"], shard["bytes"], shard["compressed_bytes"],
+                  shard["sha256"], time.time()) for shard in shards])
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO papers (paper_hash, year, title, shard, offset, length, pdf_bytes, sha256) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(entry["paper_hash"], str(year), entry["title"], shard["name"], entry["offset"], entry["length"],
+                  entry["pdf_bytes"], entry["sha256"]) for shard in shards for entry in shard["entries"]])
+
+    def get(self, paper_hash):
+        row = self.connection.execute("SELECT * FROM papers WHERE paper_hash = ?", (paper_hash,)).fetchone()
+        return dict(row) if row else None
+
+    def read_paper(self, paper_hash):
+        # Returns (metadata dict, PDF bytes) for one paper, or None if it is not in the export
+        entry = self.get(paper_hash)
+        if entry is None:
+            return None
+        with open(os.path.join(self.directory, entry["shard"]), 'rb') as file:
+            file.seek(entry["offset"])
+            data = file.read(entry["length"])
+        if entry["shard"].endswith('.zst'):
+            import zstandard
+            data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        members = {}
+        with tarfile.open(fileobj=io.BytesIO(data), mode='r:') as archive:
+            for member in archive:
+                members[os.path.splitext(member.name)[1]] = archive.extractfile(member).read()
+        return json.loads(members['.json']), members['.pdf']
+
+    def close(self):
+        self.connection.close()
+
+
+def export_archives(metadata_directory, output_directory, start_year=None, end_year=None, shard_size=1024 ** 3,
+                    max_papers=None, compression='zstd', level=3, max_workers=None, executor=None) -> dict:
+    # Bundles completed downloads into per-year tar shards (neurips-<year>-<n>.tar[.zst]) plus index.sqlite. The
+    # paper list comes from the download manifest, so the PDF directory is never rescanned; shards are written in
+    # parallel by a process pool and every PDF is streamed in bounded chunks. Re-exporting a year replaces its shards,
+    # unless none of its PDFs are on disk any more, in which case the earlier export of that year is kept
+    if compression == 'zstd':
+        # zstandard is only needed for compressed exports; a missing install fails here instead of in every worker
+        importlib.import_module('zstandard')
+    manifest = DownloadManifest(os.path.join(metadata_directory, 'manifest.sqlite'))
+    try:
+        downloads = list(manifest.completed(start_year, end_year))
+    finally:
+        manifest.close()
+    # Latest metadata row per paper; columns as written by MetadataStorage
+    wanted = {download["paper_hash"] for download in downloads}
+    metadata = {}
+    metadata_file = os.path.join(metadata_directory, 'papers_metadata.csv')
+    if os.path.exists(metadata_file) or os.path.isdir(os.path.splitext(metadata_file)[0]):
+        for rows in read_metadata_batches(metadata_file):
+            for row in rows:
+                paper_hash = get_paper_hash(row[3])
+                if paper_hash in wanted:
+                    metadata[paper_hash] = {"paper_name": row[0], "author": row[1], "year": str(row[2]),
+                                            "pdf_link": row[3], "abstract": (row[4] if len(row) > 4 else '') or ''}
+    years, missing = {}, []
+    for download in downloads:
+        # One stat per paper instead of a directory scan; manifests record absolute paths of completed downloads
+        if not download["file_path"] or not os.path.exists(download["file_path"]):
+            missing.append(download["url"])
+            continue
+        paper_metadata = metadata.get(download["paper_hash"]) or {"year": download["year"], "pdf_link": download["url"]}
+        download["metadata"] = {**paper_metadata, "paper_hash": download["paper_hash"], "sha256": download["sha256"]}
+        years.setdefault(download["year"], []).append(download)
+
+    create_directory(output_directory)
+    extension = '.tar.zst' if compression == 'zstd' else '.tar'
+    owns_executor = executor is None
+    if owns_executor:
+        # Spawned workers never inherit open SQLite connections or the caller's threads
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    futures = {}
+    try:
+        for year, papers in years.items():
+            for number, shard_papers in enumerate(plan_shards(papers, shard_size, max_papers)):
+                shard_path = os.path.join(output_directory, f"neurips-{year}-{number:05d}{extension}")
+                futures[executor.submit(write_shard, shard_path, shard_papers, compression, level)] = year
+        results = {year: [] for year in years}
+        for future in as_completed(futures):
+            results[futures[future]].append(future.result())
+    finally:
+        if owns_executor:
+            executor.shutdown(cancel_futures=True)
+
+    summary = {"years": 0, "shards": 0, "papers": 0, "bytes": 0, "compressed_bytes": 0, "missing": missing}
+    index = ShardIndex(os.path.join(output_directory, 'index.sqlite'))
+    try:
+        for year, shards in sorted(results.items()):
+            summary["missing"] += [url for shard in shards for url in shard["missing"]]
+            shards = sorted((shard for shard in shards if shard["papers"]), key=lambda shard: shard["name"])
+            if not shards:
+                # Every file vanished while the shards were written; the index keeps pointing at the old export
+                continue
+            summary["years"] += 1
+            stale = set(index.shard_names(year)) - {shard["name"] for shard in shards}
+            index.replace_year(year, shards)
+            # Shards of an earlier export of this year that the new plan no longer has
+            for name in stale:
+                if os.path.exists(os.path.join(output_directory, name)):
+                    os.remove(os.path.join(output_directory, name))
+            for shard in shards:
+                summary["shards"] += 1
+                summary["papers"] += shard["papers"]
+                summary["bytes"] += shard["bytes"]
+                summary["compressed_bytes"] += shard["compressed_bytes"]
+    finally:
+        index.close()
+    return summary
@@ -0,0 +1,55 @@
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+from .storage import TextStore
+
+
+def extract_pdf_text(file_path):
+    # Runs in a worker process: (page count, text with pages separated by form feeds)
+    from pypdf import PdfReader
+    reader = PdfReader(file_path)
+    pages = [page.extract_text() or '' for page in reader.pages]
+    return len(pages), '\f'.join(pages)
+
+
+class TextExtractor:
+    # Hands finished PDFs to a bounded process pool so text extraction overlaps with the crawl instead of being a
+    # second pass over downloaded_papers; results are cached in a TextStore by paper hash and PDF SHA-256
+    def __init__(self, text_store: TextStore, max_workers=None, executor=None):
+        self.text_store = text_store
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.executor = executor
+        self.owns_executor = executor is None
+
+    def start(self):
+        if self.executor is not None:
+            return
+        # pypdf is only needed when extraction is enabled; a missing install fails here instead of in every worker
+        importlib.import_module('pypdf')
+        # Spawned workers never inherit the event loop or the aiofiles threads
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+
+    async def extract(self, file_path, sha256, paper_hash, title, year) -> str:
+        if self.text_store.is_current(paper_hash, sha256):
+            return "cached"
+        self.start()
+        try:
+            pages, text = await asyncio.get_running_loop().run_in_executor(self.executor, extract_pdf_text, file_path)
+        except BrokenExecutor:
+            # Not the PDF's fault, so nothing is cached and the next run tries again
+            raise
+        except Exception as e:
+            # Unreadable PDFs are remembered, so they are only retried once their bytes change
+            print(f"Failed to extract text from {title}: {e!r}")
+            self.text_store.save(paper_hash, sha256, title, year, error=repr(e))
+            return "failed"
+        self.text_store.save(paper_hash, sha256, title, year, pages, text)
+        return "extracted"
+
+    def close(self):
+        if self.owns_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,349 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import sqlite3
+import time
+import urllib.robotparser
+import zlib
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+from .utils import create_directory
+
+
+class CacheMissError(aiohttp.ClientError):
+    # Raised in cache-only mode for pages that were never fetched
+    pass
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+
+def parse_content_range_total(value):
+    # Complete length from a Content-Range header ('bytes */1234' on a 416, 'bytes 0-99/1234' otherwise)
+    if not value or '/' not in value:
+        return None
+    try:
+        return int(value.rsplit('/', 1)[1])
+    except ValueError:
+        return None
+
+
+def is_congestion_error(error) -> bool:
+    # Errors that mean the server or the link is overloaded, as opposed to a bad URL
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    return isinstance(error, aiohttp.ClientResponseError) and (error.status == 429 or error.status >= 500)
+
+
+# Transient HTTP statuses worth retrying; anything else (404, 403, ...) fails immediately
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def is_retryable_error(error) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRYABLE_STATUSES
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError))
+
+
+def get_backoff_delay(attempt: int, base_delay: float, max_delay: float, retry_after=None) -> float:
+    # Full-jitter exponential backoff, but never sooner than the server's Retry-After
+    delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+def create_session(limit=100, limit_per_host=100, keepalive_timeout=30, dns_cache_ttl=300, connect_timeout=15,
+                   read_timeout=60, trace_configs=None):
+    # One tuned connection pool for a whole run: kept-alive connections, cached DNS and explicit timeouts
+    # (no total timeout, so large PDFs are only limited by the per-read timeout)
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host, keepalive_timeout=keepalive_timeout,
+                                     use_dns_cache=True, ttl_dns_cache=dns_cache_ttl)
+    timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=trace_configs)
+
+
+async def check_network_availability(url, timeout=10) -> bool:
+    # Any HTTP answer counts as reachable; only connection errors and timeouts do not
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            async with session.get(url):
+                return True
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return False
+
+
+class ByteBudget:
+    # Caps the number of PDF bytes buffered in memory across all concurrent downloads
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        size = min(size, self.max_bytes)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight + size <= self.max_bytes)
+            self.in_flight += size
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.in_flight -= size
+                self._condition.notify_all()
+
+
+class TokenBucket:
+    # Allows `rate` units per second on average with bursts of up to `burst`; a rate of None means unlimited.
+    # Waiters are served lowest priority value first (FIFO within a priority), and a request larger than the
+    # burst goes through once the bucket is full, leaving it in debt
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.burst = burst or rate or 1
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self.waited = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatcher = None
+
+    async def acquire(self, amount=1, priority=0):
+        if not self.rate:
+            return
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), amount, waiter))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await waiter
+        self.waited += time.monotonic() - started
+
+    async def _dispatch(self):
+        while self._waiters:
+            _, _, amount, waiter = self._waiters[0]
+            if waiter.done():
+                # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            needed = min(amount, self.burst)
+            if self.tokens < needed:
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+                continue
+            self.tokens -= amount
+            heapq.heappop(self._waiters)
+            waiter.set_result(None)
+
+    def limit_to(self, rate, burst=None):
+        # Lowers the rate (never raises it), e.g. to the pace a site's robots.txt asks for
+        if not self.rate or rate < self.rate:
+            self.rate = rate
+            self.burst = burst or rate
+            self.tokens = min(self.tokens, self.burst)
+
+    def metrics(self) -> dict:
+        return {"rate": self.rate, "burst": self.burst, "waiting": len(self._waiters),
+                "waited_seconds": round(self.waited, 3)}
+
+
+def parse_crawl_delay(robots_txt: str, user_agent='*'):
+    # Seconds between requests asked for by robots.txt (Crawl-delay or Request-rate), or None
+    parser = urllib.robotparser.RobotFileParser()
+    # Rules only apply once the parser counts as fetched
+    parser.modified()
+    parser.parse(robots_txt.splitlines())
+    delays = []
+    crawl_delay = parser.crawl_delay(user_agent)
+    if crawl_delay:
+        delays.append(float(crawl_delay))
+    request_rate = parser.request_rate(user_agent)
+    if request_rate and request_rate.requests:
+        delays.append(request_rate.seconds / request_rate.requests)
+    return max(delays) if delays else None
+
+
+class AdaptiveLimiter:
+    # AIMD concurrency limit for PDF downloads: grows by about one slot per window of fast, healthy responses
+    # and is cut multiplicatively on 429/5xx/timeouts, pausing new requests while the server asks for Retry-After
+    def __init__(self, initial_limit=10, min_limit=1, max_limit=100, latency_tolerance=2.0, backoff_factor=0.5,
+                 backoff_cooldown=1.0, max_error_rate=0.05):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff_factor = backoff_factor
+        self.backoff_cooldown = backoff_cooldown
+        self.max_error_rate = max_error_rate
+        self.in_flight = 0
+        self.baseline_latency = None
+        self.error_rate = 0.0
+        self.congestion_events = 0
+        self.paused_until = 0.0
+        self.last_backoff = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    async def __aenter__(self):
+        async with self._condition:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), pause)
+                    except asyncio.TimeoutError:
+                        pass
+                elif self.in_flight < self.current_limit:
+                    break
+                else:
+                    await self._condition.wait()
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def record_success(self, latency: float):
+        self.error_rate *= 0.95
+        # The baseline follows the fastest responses but slowly drifts up with a changing network
+        if self.baseline_latency is None or latency < self.baseline_latency:
+            self.baseline_latency = latency
+        else:
+            self.baseline_latency += (latency - self.baseline_latency) * 0.01
+        if latency <= self.baseline_latency * self.latency_tolerance and self.error_rate < self.max_error_rate:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def record_congestion(self, retry_after=None):
+        self.error_rate = self.error_rate * 0.95 + 0.05
+        self.congestion_events += 1
+        now = time.monotonic()
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        # A burst of failures from the same overload only halves the limit once
+        if now - self.last_backoff >= self.backoff_cooldown:
+            self.limit = max(self.min_limit, self.limit * self.backoff_factor)
+            self.last_backoff = now
+
+    def metrics(self) -> dict:
+        return {
+            "limit": self.current_limit,
+            "in_flight": self.in_flight,
+            "baseline_latency": self.baseline_latency,
+            "error_rate": round(self.error_rate, 4),
+            "congestion_events": self.congestion_events,
+        }
+
+
+class HttpCache:
+    # On-disk cache for listing and abstract pages: compressed bodies, conditional revalidation, LRU eviction
+    def __init__(self, db_file='./metadata/http_cache.sqlite', ttl=24 * 60 * 60, max_bytes=256 * 1024 * 1024,
+                 cache_only=False):
+        self.db_file = db_file
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.cache_only = cache_only
+        create_directory(os.path.dirname(os.path.abspath(db_file)))
+        self.connection = sqlite3.connect(db_file)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, url):
+        row = self.connection.execute("SELECT * FROM pages WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def touch(self, url, revalidated=False):
+        now = time.time()
+        if revalidated:
+            # A 304 proves the cached body is still current, so it is fresh for another TTL
+            self.connection.execute("UPDATE pages SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+        else:
+            self.connection.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (now, url))
+        self.connection.commit()
+
+    def store(self, url, text, etag, last_modified):
+        body = zlib.compress(text.encode('utf-8'), 6)
+        now = time.time()
+        previous = self.connection.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pages (url, body, etag, last_modified, stored_at, accessed_at, size) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (url, body, etag, last_modified, now, now, len(body)))
+        self.total_bytes += len(body) - (previous[0] if previous else 0)
+        self._evict()
+        self.connection.commit()
+
+    def _evict(self):
+        # Drop least recently used pages until the cache fits its size budget again
+        while self.total_bytes > self.max_bytes:
+            rows = self.connection.execute("SELECT url, size FROM pages ORDER BY accessed_at LIMIT 64").fetchall()
+            if not rows:
+                break
+            for row in rows:
+                self.connection.execute("DELETE FROM pages WHERE url = ?", (row["url"],))
+                self.total_bytes -= row["size"]
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    async def fetch_text(self, session, url, before_request=None, max_age=None) -> str:
+        # before_request is awaited only when the network is actually hit (e.g. to take a rate-limit token).
+        # max_age overrides the TTL for this call; max_age=0 always revalidates with a conditional request
+        entry = self.get(url)
+        max_age = self.ttl if max_age is None else max_age
+        if entry is not None and (self.cache_only or time.time() - entry["stored_at"] < max_age):
+            self.touch(url)
+            return zlib.decompress(entry["body"]).decode('utf-8')
+        if self.cache_only:
+            raise CacheMissError(f"{url} is not cached (cache-only mode)")
+        headers = {}
+        if entry is not None and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if before_request is not None:
+            await before_request()
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304 and entry is not None:
+                self.touch(url, revalidated=True)
+                return zlib.decompress(entry["body"]).decode('utf-8')
+            response.raise_for_status()
+            text = await response.text()
+            self.store(url, text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return text
+
+    def close(self):
+        self.connection.close()
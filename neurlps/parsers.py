@@ -0,0 +1,53 @@
+from bs4 import BeautifulSoup
+
+try:
+    # Optional fast HTML backend; parsing falls back to BeautifulSoup without it
+    import lxml.html
+    DEFAULT_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'bs4'
+
+# Page parsers are plain module-level functions so they can also run in a process pool.
+# Both backends return identical records for the papers.nips.cc markup.
+CONTAINER_XPATH = "/html/body/div[contains(concat(' ', normalize-space(@class), ' '), ' container-fluid ')]/div"
+
+
+def parse_year_links(html: str, parser=DEFAULT_PARSER) -> list[str]:
+    if parser == 'lxml':
+        root = lxml.html.document_fromstring(html)
+        return [str(href) for href in root.xpath("//a[contains(@href, 'paper_files/paper/')]/@href")]
+    soup = BeautifulSoup(html, 'html.parser')
+    return [a.get('href') for a in soup.find_all('a') if 'paper_files/paper/' in a.get('href', '')]
+
+
+def parse_paper_links(html: str, parser=DEFAULT_PARSER) -> list[dict]:
+    paper_links = []
+    if parser == 'lxml':
+        root = lxml.html.document_fromstring(html)
+        for a in root.xpath(CONTAINER_XPATH + "/ul/li//a"):
+            author = a.xpath("following-sibling::i[1]")
+            paper_links.append({
+                "title": a.text_content(),
+                "link": a.get('href'),
+                "author": author[0].text_content() if author else ''
+            })
+        return paper_links
+    soup = BeautifulSoup(html, 'html.parser')
+    # Find all links for papers (filter by 'Paper' text)
+    for a in soup.select("body > div.container-fluid > div > ul > li a"):
+        author = a.find_next_sibling('i')
+        paper_links.append({
+            "title": a.get_text(),
+            "link": a.get('href'),
+            "author": author.get_text() if author else ''
+        })
+    return paper_links
+
+
+def parse_abstract(html: str, parser=DEFAULT_PARSER) -> str:
+    # The abstract is the third paragraph of the paper page
+    if parser == 'lxml':
+        abstract_paras = lxml.html.document_fromstring(html).xpath(CONTAINER_XPATH + "/p")
+        return abstract_paras[2].text_content() if len(abstract_paras) > 2 else ''
+    abstract_paras = BeautifulSoup(html, 'html.parser').select('body > div.container-fluid > div > p')
+    return abstract_paras[2].text if len(abstract_paras) > 2 else ''
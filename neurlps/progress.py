@@ -0,0 +1,118 @@
+import asyncio
+import sys
+import time
+
+from .utils import format_bytes, format_duration
+
+
+class ProgressTracker:
+    def __init__(self, limiter=None, refresh_interval=0.5):
+        # Optional AdaptiveLimiter whose current concurrency limit is shown alongside the counters
+        self.limiter = limiter
+        # The hot path only bumps counters; a renderer task redraws at most every refresh_interval seconds (None disables it)
+        self.refresh_interval = refresh_interval
+        self.renderer_task = None
+        self._last_line_length = 0
+        # Initialize progress tracking variables
+        self.total_papers = 0
+        self.downloaded_papers = 0
+        self.failed_papers = 0
+        self.downloaded_bytes = 0
+        self.year_stats = {}
+        self.started_at = None
+        self.bytes_per_second = 0.0
+        self._last_sample = None
+
+    def _get_year_stats(self, year):
+        if year not in self.year_stats:
+            self.year_stats[year] = {"total_papers": 0, "downloaded": 0, "failed": 0, "in_flight": 0}
+        return self.year_stats[year]
+
+    def set_year_total(self, year, total_papers):
+        self._get_year_stats(year)["total_papers"] = total_papers
+        self.total_papers += total_papers
+
+    def add_papers(self, year, count=1):
+        self._get_year_stats(year)["total_papers"] += count
+        self.total_papers += count
+
+    def start(self, year):
+        self._get_year_stats(year)["in_flight"] += 1
+
+    def finish(self, year):
+        self._get_year_stats(year)["in_flight"] -= 1
+
+    def add_bytes(self, size):
+        self.downloaded_bytes += size
+
+    def update(self, year, status):
+        year_stats = self._get_year_stats(year)
+        if status == "success":
+            self.downloaded_papers += 1
+            year_stats["downloaded"] += 1
+        else:
+            self.failed_papers += 1
+            year_stats["failed"] += 1
+
+    def get_overall_progress(self):
+        return (self.downloaded_papers / self.total_papers) * 100 if self.total_papers > 0 else 0
+
+    def get_year_progress(self, year):
+        year_data = self.year_stats.get(year, {"downloaded": 0, "total_papers": 0})
+        year_progress = (year_data["downloaded"] / year_data["total_papers"]) * 100 if year_data["total_papers"] > 0 else 0
+        return year_progress
+
+    def get_eta(self):
+        # Remaining papers at the average rate so far
+        finished = self.downloaded_papers + self.failed_papers
+        if not self.started_at or not finished or self.total_papers <= finished:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return (self.total_papers - finished) * elapsed / finished
+
+    def _sample_rate(self):
+        # Smoothed download rate between two renders
+        now = time.monotonic()
+        if self._last_sample is not None:
+            last_time, last_bytes = self._last_sample
+            if now > last_time:
+                rate = (self.downloaded_bytes - last_bytes) / (now - last_time)
+                self.bytes_per_second = rate if not self.bytes_per_second else 0.7 * self.bytes_per_second + 0.3 * rate
+        self._last_sample = (now, self.downloaded_bytes)
+
+    def start_rendering(self):
+        self.started_at = self.started_at or time.monotonic()
+        if self.renderer_task is None and self.refresh_interval is not None:
+            self.renderer_task = asyncio.create_task(self._render_loop())
+
+    async def stop_rendering(self):
+        if self.renderer_task is not None:
+            self.renderer_task.cancel()
+            await asyncio.gather(self.renderer_task, return_exceptions=True)
+            self.renderer_task = None
+        if self.refresh_interval is None:
+            return
+        # One last frame so the final counts are always shown
+        self._sample_rate()
+        self.display_progress()
+
+    async def _render_loop(self):
+        while True:
+            self._sample_rate()
+            self.display_progress()
+            await asyncio.sleep(self.refresh_interval)
+
+    def display_progress(self):
+        # Console rendering; frontends with their own UI override this
+        line = (f"Total Papers: {self.total_papers} | Downloaded: {self.downloaded_papers} | Failed: {self.failed_papers} | "
+                f"Overall Progress: {self.get_overall_progress():.2f}% | {format_bytes(self.bytes_per_second)}/s | "
+                f"ETA {format_duration(self.get_eta())} |")
+        if self.limiter is not None:
+            line += f" Concurrency: {self.limiter.current_limit} |"
+        # Only years with downloads in flight are listed, so the line stays short on long runs
+        for year, stats in self.year_stats.items():
+            if stats["in_flight"] > 0:
+                line += f" {year}: {stats['downloaded']}/{stats['total_papers']} ({stats['in_flight']} in flight) |"
+        sys.stdout.write("\r" + line.ljust(self._last_line_length))
+        sys.stdout.flush()
+        self._last_line_length = len(line)
@@ -0,0 +1,682 @@
+import asyncio
+import contextlib
+import hashlib
+import itertools
+import os
+import time
+
+import aiofiles
+import aiohttp
+
+from .network import (AdaptiveLimiter, ByteBudget, HttpCache, TokenBucket, create_session, get_backoff_delay,
+                      is_congestion_error, is_retryable_error, parse_content_range_total, parse_crawl_delay,
+                      parse_retry_after)
+from .extraction import TextExtractor
+from .parsers import DEFAULT_PARSER, parse_abstract, parse_paper_links, parse_year_links
+from .progress import ProgressTracker
+from .search import SearchIndex
+from .storage import ContentAddressedStore, DownloadManifest, FlatLayout, MetadataStorage, TextStore, YearSnapshots
+from .utils import create_directory, get_paper_hash, sanitize_filename, sha256_file
+
+BASE_URL = "https://papers.nips.cc"
+# Request priorities for the shared request bucket: pages that discover work go before the PDFs themselves
+LISTING_PRIORITY, ABSTRACT_PRIORITY, PDF_PRIORITY = 0, 1, 2
+PRIORITY_KINDS = {LISTING_PRIORITY: 'listing', ABSTRACT_PRIORITY: 'abstract', PDF_PRIORITY: 'pdf'}
+# Shared no-op stand-in for Telemetry.stage() when a scraper runs without telemetry
+NO_TELEMETRY = contextlib.nullcontext()
+
+
+class NipsScrapper:
+    def __init__(self, base_url, download_directory, limiter, progress_tracker: ProgressTracker,
+                 metadata_storage: MetadataStorage, chunk_size=64 * 1024, max_inflight_bytes=8 * 1024 * 1024,
+                 year_workers=4, abstract_workers=None, download_workers=100, queue_size=200, manifest=None,
+                 http_cache=None, parser=DEFAULT_PARSER, parse_executor=None, retries=4, retry_base_delay=1.0,
+                 retry_max_delay=30.0, session_options=None, layout='flat', snapshots=None, fetch_abstracts=False,
+                 probe_pdfs=False, text_extractor=None, requests_per_second=None, bytes_per_second=None,
+                 priority='newest', respect_robots=True, telemetry=None, verify_pdfs=False):
+        self.base_url = base_url
+        self.download_directory = download_directory
+        # Where PDFs are written: 'flat' (one file per title), 'hashed' (content-addressed) or a store object.
+        # verify_pdfs re-hashes completed PDFs before skipping them instead of trusting the manifest's size check
+        self.verify_pdfs = verify_pdfs
+        if layout == 'flat':
+            layout = FlatLayout(download_directory, verify=verify_pdfs)
+        elif layout == 'hashed':
+            layout = ContentAddressedStore(download_directory, verify=verify_pdfs)
+        self.paper_store = layout
+        self.limiter = limiter
+        self.progress_tracker = progress_tracker
+        self.metadata_storage = metadata_storage
+        # Streaming download settings: read size per chunk and the per-process cap on buffered bytes
+        self.chunk_size = chunk_size
+        self.byte_budget = ByteBudget(max_inflight_bytes)
+        # Completed downloads are skipped and partial ones resumed across runs
+        self.manifest = manifest or DownloadManifest()
+        # A paper's metadata row only counts as written once the metadata writer has flushed it (see save_metadata)
+        metadata_storage.on_flush = self._metadata_flushed
+        # Listing and abstract pages are served from here when set; None always hits the network
+        self.http_cache = http_cache
+        # Per-year listing snapshots for sync mode; created on the first sync when not given
+        self.snapshots = snapshots
+        self.sync_changes = {}
+        # HTML parsing backend ('lxml' or 'bs4') and optional executor to offload it to
+        self.parser = parser
+        self.parse_executor = parse_executor
+        # Retry policy for transient network errors and options for the shared session (see create_session)
+        self.retries = retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.session_options = session_options or {}
+        self.session = None
+        # Pipeline settings: worker pool size per stage and the bound on each hand-off queue; download workers beyond
+        # the limiter's current limit simply wait, so the pool should be at least its max_limit.
+        # The abstract stage (one extra page per paper) runs when fetch_abstracts is set and always for metadata-only
+        # runs; without PDF bodies it is the bulk of the work, so its default pool is then as wide as the download one.
+        self.year_workers = year_workers
+        self.abstract_workers = abstract_workers
+        self.download_workers = download_workers
+        self.queue_size = queue_size
+        self.fetch_abstracts = fetch_abstracts
+        # Metadata-only runs can send a HEAD request per PDF to record its size and availability without the body
+        self.probe_pdfs = probe_pdfs
+        # Optional TextExtractor: finished PDFs go through one more stage that extracts their text in a process pool
+        self.text_extractor = text_extractor
+        # Politeness: token buckets cap requests/sec (all HTTP requests) and bytes/sec (PDF bodies) without
+        # lowering concurrency; None leaves a bucket unlimited. robots.txt Crawl-delay can only slow requests down
+        self.request_bucket = TokenBucket(requests_per_second)
+        self.byte_bucket = TokenBucket(bytes_per_second)
+        self.respect_robots = respect_robots
+        self.robots_loaded = False
+        # Order of papers in the pipeline queues: 'newest' or 'oldest' year first, or 'listing' order
+        self.priority = priority
+        self._sequence = itertools.count()
+        # Optional Telemetry: request tracing, per-stage histograms and gauges; every hook is skipped when None
+        self.telemetry = telemetry
+        if telemetry is not None:
+            telemetry.gauge('concurrency_limit', lambda: self.limiter.current_limit)
+            telemetry.gauge('in_flight_requests', lambda: self.limiter.in_flight)
+            telemetry.gauge('inflight_bytes', lambda: self.byte_budget.in_flight)
+            telemetry.gauge('rate_limit_wait_seconds', lambda: self.request_bucket.waited, bucket='requests')
+            telemetry.gauge('rate_limit_wait_seconds', lambda: self.byte_bucket.waited, bucket='bytes')
+
+    def stage(self, name, **fields):
+        # Times a block into the per-stage histograms when telemetry is enabled
+        return self.telemetry.stage(name, **fields) if self.telemetry is not None else NO_TELEMETRY
+
+    async def download_paper(self, session, pdf_url: str, save_directory: str, paper_name: str, year):
+        paper_name = sanitize_filename(paper_name)
+        # The paper store decides where the PDF lives; it is streamed into a temp file next to it first
+        file_path = self.paper_store.path_for(pdf_url, paper_name, year)
+        create_directory(os.path.dirname(file_path))
+        part_path = file_path + ".part"
+        try:
+            with self.stage('download', url=pdf_url):
+                digest = await self.with_retries(self._download_to_part, session, pdf_url, part_path)
+            # Only complete files ever appear under the final name
+            file_path = self.paper_store.commit(part_path, file_path, digest.hexdigest(), paper_name, year)
+            pdf_size = os.path.getsize(file_path)
+            # The final path is recorded as well: register() only saw the planned one, possibly under another layout
+            # or relative to another working directory
+            self.manifest.update(pdf_url, status="complete", bytes=pdf_size, sha256=digest.hexdigest(),
+                                 file_path=os.path.abspath(file_path))
+            self.progress_tracker.update(year, "success")
+            return {"status": "success", "file_name": os.path.basename(file_path), "file_path": file_path,
+                    "url": pdf_url, "year": year, "pdf_size": pdf_size}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Failed to download {paper_name}: {e!r}")
+            # The partial file is kept so the next run can resume it with a Range request
+            partial_bytes = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            self.manifest.update(pdf_url, status="failed", bytes=partial_bytes)
+            if self.telemetry is not None:
+                self.telemetry.event('error', stage='download', url=pdf_url, error=repr(e))
+            self.progress_tracker.update(year, "failed")
+            return {"status": "failed", "file_name": "", "url": pdf_url, "year": year}
+
+    async def _download_to_part(self, session, pdf_url: str, part_path: str):
+        # One download attempt into part_path; an existing partial file is resumed when the server can validate it
+        entry = self.manifest.get(pdf_url) or {}
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        validator = entry.get("etag") or entry.get("last_modified")
+        headers = {}
+        if offset and validator:
+            # If-Range makes the server resend the whole file if it changed meanwhile
+            headers = {"Range": f"bytes={offset}-", "If-Range": validator}
+        self.manifest.start_attempt(pdf_url)
+        await self.request_bucket.acquire(1, PDF_PRIORITY)
+        started = time.monotonic()
+        try:
+            async with session.get(pdf_url, headers=headers) as response:
+                if response.status == 416 and offset:
+                    # Nothing left past the offset: the partial file already holds the whole body if it has the
+                    # server's size (a crash between the last chunk and the commit), otherwise it is stale
+                    self.limiter.record_success(time.monotonic() - started)
+                    if parse_content_range_total(response.headers.get("Content-Range")) == offset:
+                        return await asyncio.get_running_loop().run_in_executor(None, sha256_file, part_path)
+                    response.release()
+                    os.remove(part_path)
+                    return await self._download_to_part(session, pdf_url, part_path)
+                response.raise_for_status()
+                # Time to first byte is what tells the limiter whether the server is keeping up
+                self.limiter.record_success(time.monotonic() - started)
+                if response.status != 206:
+                    offset = 0
+                self.manifest.update(pdf_url, status="partial", etag=response.headers.get("ETag"),
+                                     last_modified=response.headers.get("Last-Modified"))
+                if offset:
+                    digest = await asyncio.get_running_loop().run_in_executor(None, sha256_file, part_path)
+                else:
+                    digest = hashlib.sha256()
+                # Write the PDF in bounded chunks so memory stays flat regardless of file size
+                write_seconds = 0.0
+                async with aiofiles.open(part_path, 'ab' if offset else 'wb') as file:
+                    while True:
+                        async with self.byte_budget.reserve(self.chunk_size):
+                            chunk = await response.content.read(self.chunk_size)
+                            if not chunk:
+                                break
+                            # Not reading the socket while the byte bucket is empty throttles the sender via TCP
+                            await self.byte_bucket.acquire(len(chunk))
+                            digest.update(chunk)
+                            self.progress_tracker.add_bytes(len(chunk))
+                            if self.telemetry is None:
+                                await file.write(chunk)
+                            else:
+                                write_started = time.perf_counter()
+                                await file.write(chunk)
+                                write_seconds += time.perf_counter() - write_started
+                if self.telemetry is not None:
+                    self.telemetry.record_stage('write', write_seconds, url=pdf_url)
+            return digest
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if is_congestion_error(e):
+                error_headers = getattr(e, "headers", None) or {}
+                self.limiter.record_congestion(parse_retry_after(error_headers.get("Retry-After")))
+            raise
+
+    async def probe_pdf(self, session, pdf_url: str):
+        # Returns (available, size in bytes or None); 404/410 mean the PDF is gone, other errors propagate
+        return await self.with_retries(self._probe_pdf_once, session, pdf_url)
+
+    async def _probe_pdf_once(self, session, pdf_url: str):
+        await self.request_bucket.acquire(1, PDF_PRIORITY)
+        started = time.monotonic()
+        try:
+            async with session.head(pdf_url, allow_redirects=True) as response:
+                if response.status in (404, 410):
+                    return False, None
+                response.raise_for_status()
+                self.limiter.record_success(time.monotonic() - started)
+                return True, response.content_length
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if is_congestion_error(e):
+                error_headers = getattr(e, "headers", None) or {}
+                self.limiter.record_congestion(parse_retry_after(error_headers.get("Retry-After")))
+            raise
+
+    async def with_retries(self, request, *args):
+        # Retries transient failures with jittered exponential backoff; fatal errors and the last failure propagate
+        for attempt in range(self.retries + 1):
+            try:
+                return await request(*args)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries or not is_retryable_error(e):
+                    raise
+                error_headers = getattr(e, "headers", None) or {}
+                await asyncio.sleep(get_backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay,
+                                                      parse_retry_after(error_headers.get("Retry-After"))))
+
+    async def get_session(self):
+        # One long-lived session per scraper, created lazily inside the running event loop
+        if self.session is None or self.session.closed:
+            trace_configs = [self.telemetry.trace_config()] if self.telemetry is not None else None
+            self.session = create_session(trace_configs=trace_configs, **self.session_options)
+        if not self.robots_loaded:
+            await self.load_robots(self.session)
+        return self.session
+
+    async def load_robots(self, session):
+        # Slows the request bucket down to the site's robots.txt Crawl-delay/Request-rate, once per scraper
+        self.robots_loaded = True
+        if not self.respect_robots or (self.http_cache is not None and self.http_cache.cache_only):
+            return
+        try:
+            async with session.get(self.base_url + '/robots.txt') as response:
+                if response.status != 200:
+                    return
+                delay = parse_crawl_delay(await response.text())
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Failed to read robots.txt: {e!r}")
+            return
+        if delay:
+            print(f"robots.txt asks for {delay:g}s between requests")
+            self.request_bucket.limit_to(1 / delay, burst=1)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self.paper_store.close()
+
+    async def get_paper_abstract(self, paper_web_link, session) -> str:
+        try:
+            return await self.parse(parse_abstract, await self.fetch_text(session, paper_web_link, ABSTRACT_PRIORITY))
+        except Exception as e:
+            print(f"Failed to extract Abstract  from {paper_web_link}: {e}")
+        return ''
+
+    async def fetch_text(self, session, url: str, priority=LISTING_PRIORITY, max_age=None) -> str:
+        with self.stage('fetch', url=url, kind=PRIORITY_KINDS.get(priority)):
+            return await self.with_retries(self._fetch_text_once, session, url, priority, max_age)
+
+    async def _fetch_text_once(self, session, url: str, priority=LISTING_PRIORITY, max_age=None) -> str:
+        # All HTML pages go through the on-disk cache when one is configured; cache hits take no request token.
+        # max_age=0 forces a conditional request (If-None-Match/If-Modified-Since) even for a page within the TTL
+        if self.http_cache is not None:
+            return await self.http_cache.fetch_text(session, url, lambda: self.request_bucket.acquire(1, priority),
+                                                    max_age=max_age)
+        await self.request_bucket.acquire(1, priority)
+        async with session.get(url) as response:
+            response.raise_for_status()
+            return await response.text()
+
+    async def parse(self, parse_function, html: str):
+        # Parsing is CPU-bound; with a parse_executor (e.g. ProcessPoolExecutor) it stays off the event loop
+        with self.stage('parse', parser=parse_function.__name__):
+            if self.parse_executor is None:
+                return parse_function(html, self.parser)
+            return await asyncio.get_running_loop().run_in_executor(self.parse_executor, parse_function, html,
+                                                                    self.parser)
+
+    async def extract_paper_links(self, session, page_url: str, max_age=None):
+        try:
+            return await self.parse(parse_paper_links, await self.fetch_text(session, page_url, max_age=max_age))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Failed to extract paper links from {page_url}: {e}")
+            return []
+
+    async def extract_year_links(self, session, sub_link_url: str, max_age=None) -> list[str]:
+        try:
+            return await self.parse(parse_year_links, await self.fetch_text(session, sub_link_url, max_age=max_age))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Failed to extract year links from {sub_link_url}: {e}")
+            return []
+
+    async def get_max_min_year(self):
+        # Extract all year-wise sub-links; None when the index page could not be fetched (or is not in the cache)
+        session = await self.get_session()
+        year_links = await self.extract_year_links(session, self.base_url)
+        if not year_links:
+            return None
+        return int(year_links[0].split('/')[-1]), int(year_links[-1].split('/')[-1])
+
+    def convert_to_pdf_url(self, abstract_url: str) -> str:
+        return abstract_url.replace('hash/', 'file/').replace("Abstract", "Paper").replace('.html', '.pdf')
+
+    async def download_papers_from_year_range(self, start_year, end_year, sync=False, metadata_only=False,
+                                              dry_run=False):
+        # Runs the whole pipeline; in sync mode the added/changed/removed papers are returned
+        async for _ in self.iter_papers(start_year, end_year, sync=sync, metadata_only=metadata_only, dry_run=dry_run):
+            pass
+        return [change for _, changes in self.sync_changes.values() for change in changes]
+
+    async def iter_papers(self, start_year, end_year, sync=False, metadata_only=False, dry_run=False):
+        # Yields one record per paper as soon as its last stage finishes. metadata_only records papers without
+        # downloading PDFs (pdf_size/pdf_available are set when probe_pdfs is on); dry_run writes nothing and
+        # reports whether each PDF is already complete.
+        # Leaving the loop early (or closing the generator) stops the crawl.
+        mode = 'dry-run' if dry_run else 'metadata' if metadata_only else 'download'
+        if mode == 'download':
+            self.paper_store.open()
+        self.progress_tracker.start_rendering()
+        session = await self.get_session()
+        if sync and self.snapshots is None:
+            self.snapshots = YearSnapshots()
+        self.sync_changes = {}
+        # A sync diffs against the live listings, so the index and year pages are always revalidated; abstract pages
+        # keep using the cache TTL
+        listing_max_age = 0 if sync else None
+        year_links = await self.extract_year_links(session, self.base_url, listing_max_age)
+        # Stages are connected by bounded queues, so downloads start as soon as the first paper is
+        # discovered and memory stays flat instead of building one giant task list
+        # Papers are queued by priority, so with a partial run or a tight rate limit the preferred years finish first
+        year_queue = asyncio.Queue()
+        abstract_queue = asyncio.PriorityQueue(maxsize=self.queue_size)
+        download_queue = asyncio.PriorityQueue(maxsize=self.queue_size)
+        extract_queue = asyncio.Queue(maxsize=self.queue_size)
+        records = asyncio.Queue(maxsize=self.queue_size)
+        year_links = [year_link for year_link in year_links if start_year <= int(year_link.split('/')[-1]) <= end_year]
+        for year_link in sorted(year_links, key=lambda year_link: self._year_priority(year_link.split('/')[-1])):
+            year_queue.put_nowait(year_link)
+
+        fetch_abstracts = self.fetch_abstracts or mode == 'metadata'
+        abstract_workers = self.abstract_workers or (self.download_workers if mode == 'metadata' else 16)
+        paper_queue = abstract_queue if fetch_abstracts else download_queue
+        workers = [asyncio.create_task(self._year_worker(session, year_queue, paper_queue, sync, fetch_abstracts))
+                   for _ in range(self.year_workers)]
+        if fetch_abstracts:
+            workers += [asyncio.create_task(self._abstract_worker(session, abstract_queue, download_queue))
+                        for _ in range(abstract_workers)]
+        extract = self.text_extractor is not None and mode == 'download'
+        workers += [asyncio.create_task(self._download_worker(session, download_queue, records, mode,
+                                                              extract_queue if extract else None))
+                    for _ in range(self.download_workers)]
+        if extract:
+            # One worker per pool process, so at most that many PDFs are being extracted at once
+            workers += [asyncio.create_task(self._extract_worker(extract_queue, records))
+                        for _ in range(self.text_extractor.max_workers)]
+        workers.append(asyncio.create_task(self._drain(year_queue, abstract_queue, download_queue, extract_queue,
+                                                       records)))
+        try:
+            while True:
+                record = await records.get()
+                if record is None:
+                    break
+                yield record
+            if not dry_run:
+                for year, (paper_links, changes) in self.sync_changes.items():
+                    self.snapshots.commit(year, paper_links, changes)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.metadata_storage.close()
+            await self.progress_tracker.stop_rendering()
+
+    def _year_priority(self, year):
+        if self.priority == 'newest':
+            return -int(year)
+        if self.priority == 'oldest':
+            return int(year)
+        return 0
+
+    def _queue_item(self, paper):
+        # The sequence number keeps listing order within a priority and means dicts are never compared
+        return self._year_priority(paper["year"]), next(self._sequence), paper
+
+    async def _drain(self, year_queue, abstract_queue, download_queue, extract_queue, records):
+        # Each stage is drained in order, so nothing is left behind once the last queue is joined
+        await year_queue.join()
+        await abstract_queue.join()
+        await download_queue.join()
+        await extract_queue.join()
+        await records.put(None)
+
+    async def _year_worker(self, session, year_queue, paper_queue, sync=False, fetch_abstracts=False):
+        while True:
+            year_link = await year_queue.get()
+            try:
+                year = year_link.split('/')[-1]
+                paper_links_extracted = await self.extract_paper_links(session, self.base_url + year_link,
+                                                                       0 if sync else None)
+                if sync:
+                    paper_links_extracted = self._select_sync_papers(year, paper_links_extracted)
+                self.progress_tracker.set_year_total(year, len(paper_links_extracted))
+
+                for paper_link in paper_links_extracted:
+                    paper = {
+                        "pdf_url": self.base_url + self.convert_to_pdf_url(paper_link["link"]),
+                        "paper_name": paper_link["title"],
+                        "year": year,
+                        "author": paper_link["author"],
+                        "abstract": '',
+                        "refresh": paper_link.get("refresh", False),
+                    }
+                    if fetch_abstracts:
+                        paper["abstract_url"] = self.base_url + paper_link["link"]
+                    await paper_queue.put(self._queue_item(paper))
+            except Exception as e:
+                print(f"Failed to process year {year_link}: {e}")
+            finally:
+                year_queue.task_done()
+
+    async def _abstract_worker(self, session, abstract_queue, download_queue):
+        while True:
+            *_, paper = await abstract_queue.get()
+            try:
+                abstract_url = paper.pop("abstract_url")
+                paper["abstract"] = await self.get_paper_abstract(abstract_url, session)
+                await download_queue.put(self._queue_item(paper))
+            finally:
+                abstract_queue.task_done()
+
+    def _select_sync_papers(self, year, paper_links):
+        # Sync mode keeps papers added or changed since the year's last snapshot, plus any whose PDF never completed or
+        # whose metadata row was never flushed
+        if not paper_links:
+            # An empty or failed listing must not be recorded as every paper being removed
+            return []
+        changes = self.snapshots.diff(year, paper_links)
+        self.sync_changes[year] = (paper_links, changes)
+        changed = {change["paper_hash"]: change["change"] for change in changes}
+        selected = []
+        for paper_link in paper_links:
+            paper_hash = get_paper_hash(paper_link["link"])
+            entry = self.manifest.get(self.base_url + self.convert_to_pdf_url(paper_link["link"]))
+            if paper_hash in changed or entry is None or entry["status"] != "complete" or not entry["metadata_written"]:
+                selected.append({**paper_link, "refresh": changed.get(paper_hash) == "changed"})
+        return selected
+
+    async def _download_worker(self, session, download_queue, records, mode='download', extract_queue=None):
+        while True:
+            *_, paper = await download_queue.get()
+            try:
+                if mode == 'dry-run':
+                    result = self.plan_paper(**paper)
+                elif mode == 'metadata':
+                    result = await self.record_paper(session, **paper)
+                else:
+                    result = await self.download_paper_with_semaphore(session, **paper)
+            except Exception as e:
+                print(f"Failed to download {paper['paper_name']}: {e}")
+                self.progress_tracker.update(paper["year"], "failed")
+                result = {"status": "failed", "file_name": ""}
+            record = {
+                "paper_name": paper["paper_name"],
+                "author": paper["author"],
+                "year": paper["year"],
+                "pdf_link": paper["pdf_url"],
+                "abstract": paper["abstract"],
+                "status": result["status"],
+                "file_name": result["file_name"],
+                "pdf_size": result.get("pdf_size"),
+                "pdf_available": result.get("pdf_available"),
+                "text_status": None,
+            }
+            try:
+                # Only PDFs that are on disk move on to text extraction
+                if extract_queue is not None and result["status"] in ("success", "skipped"):
+                    await extract_queue.put((record, result["file_path"]))
+                else:
+                    await records.put(record)
+            finally:
+                download_queue.task_done()
+
+    async def _extract_worker(self, extract_queue, records):
+        while True:
+            record, file_path = await extract_queue.get()
+            try:
+                entry = self.manifest.get(record["pdf_link"]) or {}
+                with self.stage('extract', url=record["pdf_link"]):
+                    record["text_status"] = await self.text_extractor.extract(
+                        file_path, entry.get("sha256"), get_paper_hash(record["pdf_link"]), record["paper_name"],
+                        record["year"])
+            except Exception as e:
+                print(f"Failed to extract text from {record['paper_name']}: {e!r}")
+                record["text_status"] = "failed"
+            try:
+                await records.put(record)
+            finally:
+                extract_queue.task_done()
+
+    def plan_paper(self, pdf_url: str, paper_name: str, year, author, abstract='', refresh=False):
+        # Dry run: report what a real run would do without touching the network, the manifest or the metadata
+        file_path = self.paper_store.path_for(pdf_url, paper_name, year)
+        complete = self.manifest.is_complete(pdf_url, file_path)
+        self.progress_tracker.update(year, "success")
+        return {"status": "complete" if complete else "pending", "file_name": os.path.basename(file_path),
+                "url": pdf_url, "year": year}
+
+    async def record_paper(self, session, pdf_url: str, paper_name: str, year, author, abstract='', refresh=False):
+        # Metadata-only run: the paper is registered as pending, so a later full run downloads it without a new row
+        file_path = self.paper_store.path_for(pdf_url, paper_name, year)
+        status = "known"
+        if await self.save_metadata(pdf_url, file_path, paper_name, year, author, abstract, refresh):
+            status = "recorded"
+        available = pdf_size = None
+        if self.probe_pdfs:
+            # HEADs share the download limiter, so a congested server slows the probes down as well
+            async with self.limiter:
+                try:
+                    available, pdf_size = await self.probe_pdf(session, pdf_url)
+                    self.manifest.update(pdf_url, available=int(available), remote_bytes=pdf_size)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    print(f"Failed to probe {paper_name}: {e!r}")
+        self.progress_tracker.update(year, "success")
+        return {"status": status, "file_name": os.path.basename(file_path), "url": pdf_url, "year": year,
+                "pdf_size": pdf_size, "pdf_available": available}
+
+    async def download_paper_with_semaphore(self, session, pdf_url: str, paper_name: str, year, author, abstract='',
+                                            refresh=False):
+        file_path = self.paper_store.path_for(pdf_url, paper_name, year)
+        if self.manifest.is_complete(pdf_url, file_path) and await self.paper_store.verify(
+                file_path, self.manifest.get(pdf_url)["sha256"]):
+            # A paper whose listing entry changed (or whose row was lost) only needs its metadata written again
+            await self.save_metadata(pdf_url, file_path, paper_name, year, author, abstract, refresh)
+            self.progress_tracker.update(year, "success")
+            return {"status": "skipped", "file_name": os.path.basename(file_path), "file_path": file_path,
+                    "url": pdf_url, "year": year, "pdf_size": os.path.getsize(file_path)}
+        async with self.limiter:
+            self.progress_tracker.start(year)
+            try:
+                # Retries only redo the download
+                await self.save_metadata(pdf_url, file_path, paper_name, year, author, abstract, refresh)
+                return await self.download_paper(session, pdf_url, self.download_directory, paper_name, year)
+            finally:
+                self.progress_tracker.finish(year)
+
+    async def save_metadata(self, pdf_url, file_path, paper_name, year, author, abstract='', refresh=False) -> bool:
+        # Metadata is written once per paper: the first time it is seen, when its listing entry changed, or again when
+        # an earlier run died before its row was flushed. The paper is registered first and marked as written by
+        # _metadata_flushed, so a killed run leaves it unmarked instead of losing the row for good
+        entry = self.manifest.get(pdf_url)
+        if not (refresh or entry is None or not entry["metadata_written"]):
+            return False
+        self.manifest.register(pdf_url, year, file_path)
+        await self.metadata_storage.save_paper_metadata(paper_name=paper_name, author=author, year=year,
+                                                        pdf_link=pdf_url, abstract=abstract)
+        return True
+
+    def _metadata_flushed(self, rows):
+        # Called by the metadata writer; rows are in MetadataStorage column order
+        self.manifest.mark_metadata_written(row[3] for row in rows)
+
+    async def seed_work_queue(self, work_queue, start_year, end_year) -> int:
+        # Lists every year in range once and adds its papers to the shared queue
+        session = await self.get_session()
+        year_links = [year_link for year_link in await self.extract_year_links(session, self.base_url)
+                      if start_year <= int(year_link.split('/')[-1]) <= end_year]
+        listings = await asyncio.gather(*(self.extract_paper_links(session, self.base_url + year_link)
+                                          for year_link in year_links))
+        papers = [{
+            "pdf_url": self.base_url + self.convert_to_pdf_url(paper_link["link"]),
+            "paper_name": paper_link["title"],
+            "year": year_link.split('/')[-1],
+            "author": paper_link["author"],
+        } for year_link, paper_links in zip(year_links, listings) for paper_link in paper_links]
+        return work_queue.add_tasks(papers)
+
+    async def run_shard(self, work_queue, owner):
+        # Leases batches from the shared queue until it is drained; inside the shard the limiter still sets concurrency
+        self.paper_store.open()
+        self.progress_tracker.start_rendering()
+        session = await self.get_session()
+        download_queue = asyncio.Queue(maxsize=self.queue_size)
+        workers = [asyncio.create_task(self._shard_download_worker(session, work_queue, owner, download_queue))
+                   for _ in range(self.download_workers)]
+        try:
+            while True:
+                work_queue.renew(owner)
+                # Small leases keep the work spread across shards; the bounded download queue paces the claims
+                papers = work_queue.claim(owner, self.limiter.current_limit)
+                if not papers:
+                    # A leased paper (here or in another shard) that fails goes back to pending and is retried in
+                    # this run until it runs out of attempts; stale leases of a crashed shard are taken over as well
+                    if not work_queue.has_leased():
+                        break
+                    await asyncio.sleep(1.0)
+                    continue
+                for paper in papers:
+                    self.progress_tracker.add_papers(paper["year"])
+                    await download_queue.put(paper)
+            await download_queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.metadata_storage.close()
+            await self.progress_tracker.stop_rendering()
+
+    async def _shard_download_worker(self, session, work_queue, owner, download_queue):
+        while True:
+            paper = await download_queue.get()
+            try:
+                result = await self.download_paper_with_semaphore(session, **paper)
+                work_queue.finish(paper["pdf_url"], owner, result["status"] != "failed")
+            except Exception as e:
+                print(f"Failed to download {paper['paper_name']}: {e}")
+                self.progress_tracker.update(paper["year"], "failed")
+                work_queue.finish(paper["pdf_url"], owner, False)
+            finally:
+                download_queue.task_done()
+
+
+@contextlib.asynccontextmanager
+async def open_scraper(download_directory='./downloaded_papers', metadata_directory='./metadata', base_url=BASE_URL,
+                       metadata_format='csv', concurrency=10, max_concurrency=100, progress=False, extract_text=False,
+                       extract_workers=None, index=True, offline=False, **options):
+    # Builds a scraper with the usual on-disk state under metadata_directory (metadata, search index, manifest, page
+    # cache, sync snapshots, extracted texts) and closes all of it on exit; options are passed to NipsScrapper.
+    # A telemetry option is shared with the metadata writer; starting and stopping it is up to the caller
+    # Starts at the old fixed concurrency and adapts to what the link and server sustain
+    limiter = AdaptiveLimiter(initial_limit=concurrency, max_limit=max_concurrency)
+    progress_tracker = ProgressTracker(limiter=limiter, refresh_interval=0.5 if progress else None)
+    # Every metadata batch also goes into the search index, so papers are searchable while the crawl runs
+    search_index = SearchIndex(os.path.join(metadata_directory, 'search.sqlite')) if index else None
+    metadata_storage = MetadataStorage(os.path.join(metadata_directory, 'papers_metadata.csv'), backend=metadata_format,
+                                       search_index=search_index, telemetry=options.get('telemetry'))
+    manifest = DownloadManifest(os.path.join(metadata_directory, 'manifest.sqlite'))
+    # Offline mode answers every listing/abstract page from the local cache and never touches the network
+    http_cache = HttpCache(os.path.join(metadata_directory, 'http_cache.sqlite'), cache_only=offline)
+    snapshots = YearSnapshots(os.path.join(metadata_directory, 'snapshots.sqlite'),
+                              os.path.join(metadata_directory, 'changelog.jsonl'))
+    text_extractor = None
+    if extract_text:
+        text_extractor = TextExtractor(TextStore(os.path.join(metadata_directory, 'fulltext.sqlite')),
+                                       max_workers=extract_workers)
+    nips_scrapper = NipsScrapper(base_url, download_directory, limiter, progress_tracker, metadata_storage,
+                                 download_workers=max_concurrency, manifest=manifest, http_cache=http_cache,
+                                 snapshots=snapshots, text_extractor=text_extractor, **options)
+    try:
+        yield nips_scrapper
+    finally:
+        await nips_scrapper.close()
+        manifest.close()
+        http_cache.close()
+        snapshots.close()
+        if text_extractor is not None:
+            text_extractor.close()
+            # Texts extracted by this run become searchable once the metadata writer has finished
+            if search_index is not None:
+                search_index.index_texts(text_extractor.text_store.db_file)
+            text_extractor.text_store.close()
+        if search_index is not None:
+            search_index.close()
+
+
+async def iter_papers(start_year, end_year, **options):
+    # Programmatic entry point: yields paper records from a scraper built by open_scraper; options go to open_scraper
+    # and iter_papers (sync, metadata_only, dry_run, layout, ...)
+    run_options = {key: options.pop(key) for key in ('sync', 'metadata_only', 'dry_run') if key in options}
+    async with open_scraper(**options) as nips_scrapper:
+        async for record in nips_scrapper.iter_papers(start_year, end_year, **run_options):
+            yield record
@@ -0,0 +1,148 @@
+import os
+import re
+import sqlite3
+
+from .storage import read_metadata_batches
+from .utils import create_directory, get_paper_hash
+
+
+class SearchIndex:
+    # SQLite FTS5 index over titles, authors, abstracts and extracted PDF texts. It implements the metadata backend
+    # interface (open/write_rows/close), so behind MetadataStorage every flushed batch is searchable right away
+    def __init__(self, db_file='./metadata/search.sqlite'):
+        self.db_file = db_file
+        self.connection = None
+
+    def open(self):
+        if self.connection is not None:
+            return
+        create_directory(os.path.dirname(os.path.abspath(self.db_file)))
+        # The metadata writer opens, writes and closes from executor threads, one call at a time
+        self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS papers (
+                id INTEGER PRIMARY KEY,
+                paper_hash TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL DEFAULT '',
+                author TEXT NOT NULL DEFAULT '',
+                year TEXT,
+                pdf_link TEXT,
+                abstract TEXT NOT NULL DEFAULT '',
+                body TEXT NOT NULL DEFAULT ''
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                title, author, abstract, body, content='papers', content_rowid='id',
+                tokenize='porter unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+                INSERT INTO papers_fts (rowid, title, author, abstract, body)
+                VALUES (new.id, new.title, new.author, new.abstract, new.body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+                INSERT INTO papers_fts (papers_fts, rowid, title, author, abstract, body)
+                VALUES ('delete', old.id, old.title, old.author, old.abstract, old.body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+                INSERT INTO papers_fts (papers_fts, rowid, title, author, abstract, body)
+                VALUES ('delete', old.id, old.title, old.author, old.abstract, old.body);
+                INSERT INTO papers_fts (rowid, title, author, abstract, body)
+                VALUES (new.id, new.title, new.author, new.abstract, new.body);
+            END;
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value
+            );
+        """)
+        self.connection.commit()
+
+    def write_rows(self, rows):
+        # Rows in MetadataStorage column order; a paper seen again is updated in place, and an empty abstract
+        # never overwrites one fetched earlier
+        self.connection.executemany("""
+            INSERT INTO papers (paper_hash, title, author, year, pdf_link, abstract) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (paper_hash) DO UPDATE SET
+                title = excluded.title, author = excluded.author, year = excluded.year, pdf_link = excluded.pdf_link,
+                abstract = CASE WHEN excluded.abstract != '' THEN excluded.abstract ELSE papers.abstract END""",
+            [(get_paper_hash(row[3]), row[0], row[1], str(row[2]), row[3], row[4] if len(row) > 4 else '')
+             for row in rows])
+        self.connection.commit()
+
+    def add_paper(self, paper_name, author, year, pdf_link, abstract=''):
+        self.open()
+        self.write_rows([[paper_name, author, year, pdf_link, abstract]])
+
+    def index_metadata(self, metadata_file, batch_size=1000) -> int:
+        # Backfills from an existing papers_metadata.csv or its Parquet dataset directory. Rows are upserted, so it
+        # is safe to rerun
+        self.open()
+        indexed = 0
+        for rows in read_metadata_batches(metadata_file, batch_size):
+            self.write_rows(rows)
+            indexed += len(rows)
+        return indexed
+
+    def index_texts(self, text_db_file) -> int:
+        # Pulls in PDF texts extracted since the last call from a TextStore database (see TextExtractor)
+        self.open()
+        if not os.path.exists(text_db_file):
+            return 0
+        row = self.connection.execute("SELECT value FROM state WHERE key = 'texts_indexed_at'").fetchone()
+        since = row[0] if row else 0
+        self.connection.execute("ATTACH DATABASE ? AS text_store", (text_db_file,))
+        try:
+            latest = self.connection.execute("SELECT MAX(extracted_at) FROM text_store.texts").fetchone()[0]
+            cursor = self.connection.execute("""
+                INSERT INTO papers (paper_hash, title, year, body)
+                SELECT paper_hash, COALESCE(title, ''), year, text FROM text_store.texts
+                WHERE extracted_at > ? AND error IS NULL
+                ON CONFLICT (paper_hash) DO UPDATE SET body = excluded.body""", (since,))
+            indexed = cursor.rowcount
+            if latest is not None:
+                self.connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('texts_indexed_at', ?)",
+                                        (latest,))
+            self.connection.commit()
+        finally:
+            self.connection.execute("DETACH DATABASE text_store")
+        return indexed
+
+    @staticmethod
+    def to_match_query(query):
+        # Plain input -> every word must match, the last one as a prefix, so partial words work while typing
+        words = re.findall(r'\w+', query)
+        if not words:
+            return ''
+        return ' '.join(f'"{word}"' for word in words) + '*'
+
+    def search(self, query, limit=20, year=None, raw=False, highlight=('[', ']')) -> list[dict]:
+        # Ranked by BM25 with title matches weighted highest; raw=True passes FTS5 query syntax through
+        # (column filters, OR, NEAR, ...), where malformed queries raise sqlite3.OperationalError
+        self.open()
+        match = query if raw else self.to_match_query(query)
+        if not match:
+            return []
+        sql = """
+            SELECT papers.paper_hash, papers.title, papers.author, papers.year, papers.pdf_link,
+                   snippet(papers_fts, -1, ?, ?, ' ... ', 16) AS snippet,
+                   bm25(papers_fts, 10.0, 4.0, 2.0, 1.0) AS score
+            FROM papers_fts JOIN papers ON papers.id = papers_fts.rowid
+            WHERE papers_fts MATCH ?"""
+        params = [highlight[0], highlight[1], match]
+        if year is not None:
+            sql += " AND papers.year = ?"
+            params.append(str(year))
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def count(self) -> int:
+        self.open()
+        return self.connection.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
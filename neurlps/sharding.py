@@ -0,0 +1,228 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .network import AdaptiveLimiter
+from .progress import ProgressTracker
+from .scraper import NipsScrapper
+from .storage import DownloadManifest
+from .utils import create_directory, get_paper_hash
+
+
+class QueueMetadataStorage:
+    # Stands in for MetadataStorage inside shard workers: rows go to the shared work queue and are merged once at the end
+    def __init__(self, work_queue):
+        self.work_queue = work_queue
+        self.on_flush = None
+
+    async def save_paper_metadata(self, paper_name, author, year, pdf_link, abstract=''):
+        # The queue commits every row right away, so it is written as soon as it is recorded
+        self.work_queue.record_metadata(paper_name, author, year, pdf_link, abstract)
+        if self.on_flush is not None:
+            self.on_flush([[paper_name, author, year, pdf_link, abstract]])
+
+    async def close(self):
+        pass
+
+
+class WorkQueue:
+    # Shared work set for sharded crawls. Any number of processes, local or on other hosts that mount the same file,
+    # lease papers from it; metadata is merged here keyed by URL so every paper is recorded exactly once
+    def __init__(self, db_file='./metadata/work_queue.sqlite', lease_seconds=15 * 60, max_attempts=3):
+        self.db_file = db_file
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        create_directory(os.path.dirname(os.path.abspath(db_file)))
+        # Transactions are managed explicitly so a lease is taken atomically across processes
+        self.connection = sqlite3.connect(db_file, timeout=60, isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        # Unlike the other stores this file may be shared by several hosts: WAL needs shared memory on one host and
+        # breaks on network filesystems, so the queue keeps the rollback journal and relies on file locks (the
+        # filesystem must support them, as NFSv4 and SMB do)
+        self.connection.execute("PRAGMA journal_mode=DELETE")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                url TEXT PRIMARY KEY,
+                paper_hash TEXT NOT NULL,
+                year TEXT,
+                paper_name TEXT,
+                author TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS metadata (
+                url TEXT PRIMARY KEY,
+                paper_name TEXT,
+                author TEXT,
+                year TEXT,
+                abstract TEXT,
+                exported INTEGER NOT NULL DEFAULT 0,
+                exported_by TEXT,
+                export_claimed_at REAL
+            )""")
+
+    def add_tasks(self, papers) -> int:
+        # Re-seeding is harmless: papers already in the queue keep their state
+        now = time.time()
+        before = self.connection.total_changes
+        self.connection.execute("BEGIN IMMEDIATE")
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO tasks (url, paper_hash, year, paper_name, author, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(paper["pdf_url"], get_paper_hash(paper["pdf_url"]), paper["year"], paper["paper_name"], paper["author"], now)
+             for paper in papers])
+        self.connection.execute("COMMIT")
+        return self.connection.total_changes - before
+
+    def claim(self, owner, limit):
+        # Pending papers and papers whose lease ran out (a crashed worker) are handed to the caller
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Newest years first, like the single-process pipeline's default priority
+            rows = self.connection.execute(
+                "SELECT url AS pdf_url, paper_name, year, author FROM tasks "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY CAST(year AS INTEGER) DESC LIMIT ?", (now, limit)).fetchall()
+            self.connection.executemany(
+                "UPDATE tasks SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE url = ?", [(owner, now + self.lease_seconds, now, row["pdf_url"]) for row in rows])
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return [dict(row) for row in rows]
+
+    def renew(self, owner):
+        now = time.time()
+        self.connection.execute("UPDATE tasks SET lease_expires = ? WHERE owner = ? AND status = 'leased'",
+                                (now + self.lease_seconds, owner))
+
+    def finish(self, url, owner, succeeded):
+        # Failed papers go back to the queue until they run out of attempts
+        self.connection.execute(
+            "UPDATE tasks SET status = CASE WHEN ? THEN 'done' WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "lease_expires = NULL, updated_at = ? WHERE url = ? AND owner = ?",
+            (succeeded, self.max_attempts, time.time(), url, owner))
+
+    def has_leased(self) -> bool:
+        # Leased papers can still fail and come back as pending, so a shard keeps polling until none are left
+        return self.connection.execute("SELECT 1 FROM tasks WHERE status = 'leased' LIMIT 1").fetchone() is not None
+
+    def counts(self):
+        return dict(self.connection.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+
+    def record_metadata(self, paper_name, author, year, pdf_link, abstract=''):
+        self.connection.execute(
+            "INSERT OR IGNORE INTO metadata (url, paper_name, author, year, abstract) VALUES (?, ?, ?, ?, ?)",
+            (pdf_link, paper_name, author, year, abstract))
+
+    async def export_metadata(self, metadata_storage, exporter) -> int:
+        # Rows are claimed before they are written and marked exported once the store is flushed, so concurrent
+        # exporters never write the same paper twice; a claim left behind by a crash is taken over after the lease
+        now = time.time()
+        self.connection.execute(
+            "UPDATE metadata SET exported_by = ?, export_claimed_at = ? "
+            "WHERE exported = 0 AND (exported_by IS NULL OR export_claimed_at < ?)",
+            (exporter, now, now - self.lease_seconds))
+        rows = self.connection.execute(
+            "SELECT url, paper_name, author, year, abstract FROM metadata WHERE exported = 0 AND exported_by = ? ORDER BY year, url",
+            (exporter,)).fetchall()
+        for row in rows:
+            await metadata_storage.save_paper_metadata(paper_name=row["paper_name"], author=row["author"],
+                                                       year=row["year"], pdf_link=row["url"],
+                                                       abstract=row["abstract"] or '')
+        await metadata_storage.close()
+        self.connection.execute("UPDATE metadata SET exported = 1 WHERE exported = 0 AND exported_by = ?", (exporter,))
+        return len(rows)
+
+    def close(self):
+        self.connection.close()
+
+
+async def run_shard(queue_file, owner, base_url, download_directory, manifest_file='./metadata/manifest.sqlite',
+                    concurrency=10, max_concurrency=100, **options):
+    # One shard: its own event loop, session, limiter and manifest connection, fed from the shared work queue;
+    # options are passed to NipsScrapper (layout, parser, rate limits, ...)
+    work_queue = WorkQueue(queue_file)
+    manifest = DownloadManifest(manifest_file)
+    concurrents = AdaptiveLimiter(initial_limit=concurrency, max_limit=max_concurrency)
+    # Shards stay quiet; the coordinator prints progress for all of them from the work queue
+    progress_tracker = ProgressTracker(limiter=concurrents, refresh_interval=None)
+    nips_scrapper = NipsScrapper(base_url, download_directory, concurrents, progress_tracker,
+                                 QueueMetadataStorage(work_queue), download_workers=max_concurrency, manifest=manifest,
+                                 respect_robots=False, **options)
+    try:
+        await nips_scrapper.run_shard(work_queue, owner)
+    finally:
+        await nips_scrapper.close()
+        manifest.close()
+        work_queue.close()
+    return progress_tracker.downloaded_papers, progress_tracker.failed_papers
+
+
+def run_shard_process(queue_file, owner, base_url, download_directory, manifest_file='./metadata/manifest.sqlite',
+                      concurrency=10, max_concurrency=100, **options):
+    # Entry point of a local shard process
+    return asyncio.run(run_shard(queue_file, owner, base_url, download_directory, manifest_file, concurrency,
+                                 max_concurrency, **options))
+
+
+def _share(total, parts, index) -> int:
+    # Part index of total split into parts that differ by at most one
+    return total // parts + (index < total % parts)
+
+
+async def run_sharded_crawl(nips_scrapper, queue_file, processes, start_year, end_year, metadata_storage, layout='flat',
+                            max_concurrency=100, concurrency=10) -> int:
+    # Seeds the shared queue, drains it with local shard processes and merges their metadata into one store.
+    # Other hosts can join by running the same command against the same queue file. Returns the number of papers
+    # that failed for good or are still pending, so callers can exit non-zero like a single-process crawl
+    work_queue = WorkQueue(queue_file)
+    added = await nips_scrapper.seed_work_queue(work_queue, start_year, end_year)
+    print(f"Work queue: {added} new papers, {work_queue.counts()}")
+    owner = f"{socket.gethostname()}-{os.getpid()}"
+    # concurrency, max_concurrency and the rate limits (already lowered to robots.txt, which the shards therefore
+    # skip) are this host's totals: every shard gets an equal share, so more processes never means more load on the
+    # server. A shard needs at least one download slot, hence no more shards than the initial concurrency
+    processes = max(1, min(processes, concurrency))
+    request_rate, byte_rate = nips_scrapper.request_bucket.rate, nips_scrapper.byte_bucket.rate
+    shard_options = {"layout": layout, "parser": nips_scrapper.parser, "verify_pdfs": nips_scrapper.verify_pdfs,
+                     "requests_per_second": request_rate and request_rate / processes,
+                     "bytes_per_second": byte_rate and byte_rate / processes}
+    loop = asyncio.get_running_loop()
+    try:
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+            shards = [loop.run_in_executor(pool, functools.partial(
+                run_shard_process, queue_file, f"{owner}-{index}", nips_scrapper.base_url,
+                nips_scrapper.download_directory, nips_scrapper.manifest.db_file,
+                concurrency=_share(concurrency, processes, index),
+                max_concurrency=_share(max_concurrency, processes, index), **shard_options))
+                for index in range(processes)]
+            pending = set(shards)
+            while pending:
+                _, pending = await asyncio.wait(pending, timeout=1.0)
+                counts = work_queue.counts()
+                sys.stdout.write(f"\rDone: {counts.get('done', 0)} | Leased: {counts.get('leased', 0)} | "
+                                 f"Pending: {counts.get('pending', 0)} | Failed: {counts.get('failed', 0)} |")
+                sys.stdout.flush()
+            results = [shard.result() for shard in shards]
+        print(f"\nShards finished: {sum(done for done, _ in results)} downloaded, "
+              f"{sum(failed for _, failed in results)} failed")
+        exported = await work_queue.export_metadata(metadata_storage, owner)
+        print(f"Merged metadata for {exported} papers")
+        counts = work_queue.counts()
+        return counts.get('failed', 0) + counts.get('pending', 0)
+    finally:
+        work_queue.close()
@@ -0,0 +1,597 @@
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+
+from .utils import create_directory, get_paper_hash, sanitize_filename, sha256_file
+
+
+class MetadataFileError(Exception):
+    # Raised for an existing metadata file that new rows cannot be appended to
+    pass
+
+
+class CsvBackend:
+    # Appends rows to a single CSV file; the header is only written for a new file. Every batch is flushed to the OS
+    # right away, so a written batch survives the process being killed
+    durable_writes = True
+
+    def __init__(self, file_path, columns):
+        self.file_path = file_path
+        self.columns = columns
+        self.file = None
+        # Checked up front, so a crawl never starts on a file it cannot append to
+        header = self._read_header()
+        if header is not None and len(header) > len(columns):
+            raise MetadataFileError(f"{file_path} has {len(header)} columns, expected {len(columns)} "
+                                    f"({', '.join(columns)}); move it away or use another metadata directory")
+
+    def _read_header(self):
+        if not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0:
+            return None
+        with open(self.file_path, newline='', encoding='utf-8') as file:
+            return next(csv.reader(file), [])
+
+    def open(self):
+        header = self._read_header()
+        if header is not None and len(header) < len(self.columns):
+            self._migrate(header)
+        self.file = open(self.file_path, mode='a', newline='', encoding='utf-8')
+        if header is None:
+            csv.writer(self.file).writerow(self.columns)
+
+    def _migrate(self, header):
+        # Files from before a column was added (the old CLI wrote no abstract) are rewritten once with the missing
+        # columns appended and left empty, so new rows never have more fields than the header
+        part_path = self.file_path + '.part'
+        with open(self.file_path, newline='', encoding='utf-8') as source, \
+                open(part_path, 'w', newline='', encoding='utf-8') as target:
+            reader = csv.reader(source)
+            next(reader, None)
+            writer = csv.writer(target)
+            writer.writerow(header + self.columns[len(header):])
+            writer.writerows(row + [''] * (len(self.columns) - len(row)) for row in reader)
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(part_path, self.file_path)
+
+    def write_rows(self, rows):
+        csv.writer(self.file).writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+
+
+class ParquetBackend:
+    # Writes a hive-style dataset (<directory>/<partition_column>=<value>/part-<run>-<id>.parquet) so a single
+    # year or column can be read without parsing everything; every flushed batch becomes one row group. A Parquet file
+    # is only readable once its footer is written by close(), so rows count as written only then
+    durable_writes = False
+
+    def __init__(self, directory, columns, partition_column, compression='zstd', dictionary_columns=()):
+        self.directory = directory
+        self.columns = columns
+        self.partition_column = partition_column
+        self.compression = compression
+        self.dictionary_columns = list(dictionary_columns)
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.writers = {}
+
+    def open(self):
+        # pyarrow is only needed when this backend is selected
+        import pyarrow
+        import pyarrow.parquet
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in self.columns
+                                      if column != self.partition_column])
+
+    def _get_writer(self, value):
+        if value not in self.writers:
+            partition_directory = os.path.join(self.directory, f"{self.partition_column}={value}")
+            create_directory(partition_directory)
+            # Every writer gets a file of its own: a reopened backend, or another storage started by this process in
+            # the same second, must never truncate a file that already holds rows
+            file_name = f"part-{self.run_id}-{uuid.uuid4().hex[:12]}.parquet"
+            self.writers[value] = self.pq.ParquetWriter(
+                os.path.join(partition_directory, file_name), self.schema,
+                compression=self.compression, use_dictionary=self.dictionary_columns)
+        return self.writers[value]
+
+    def write_rows(self, rows):
+        partition_index = self.columns.index(self.partition_column)
+        partitions = {}
+        for row in rows:
+            partitions.setdefault(str(row[partition_index]), []).append(row)
+        for value, partition_rows in partitions.items():
+            table = self.pa.table({
+                column: [None if row[index] is None else str(row[index]) for row in partition_rows]
+                for index, column in enumerate(self.columns) if index != partition_index
+            }, schema=self.schema)
+            self._get_writer(value).write_table(table)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+def read_metadata_batches(metadata_file, batch_size=1000):
+    # Rows of an existing papers_metadata.csv or its Parquet dataset directory in MetadataStorage column order, in
+    # batches; older files with other header names share the same column order
+    dataset_directory = os.path.splitext(metadata_file)[0]
+    if os.path.isdir(dataset_directory) and not os.path.exists(metadata_file):
+        return _read_parquet_batches(dataset_directory, batch_size)
+    return _read_csv_batches(metadata_file, batch_size)
+
+
+def _read_csv_batches(csv_file, batch_size):
+    with open(csv_file, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        rows = []
+        for row in reader:
+            if len(row) >= 4:
+                rows.append(row)
+            if len(rows) == batch_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+
+def _read_parquet_batches(directory, batch_size):
+    # pyarrow is only needed for Parquet metadata
+    import pyarrow.dataset
+    dataset = pyarrow.dataset.dataset(directory, format='parquet', partitioning='hive')
+    names = dataset.schema.names
+    year_column = next(name for name in names if name.lower() == 'year')
+    columns = [name for name in names if name != year_column]
+    for batch in dataset.to_batches(batch_size=batch_size):
+        records = batch.to_pylist()
+        yield [[record[columns[0]], record[columns[1]], record[year_column], record[columns[2]],
+                (record[columns[3]] if len(columns) > 3 else None) or ''] for record in records]
+
+
+class MetadataStorage:
+    def __init__(self, csv_file='./metadata/papers_metadata.csv', batch_size=500, flush_interval=1.0, backend='csv',
+                 search_index=None, telemetry=None, on_flush=None):
+        self.csv_file = csv_file
+        # One schema for every frontend; abstract stays empty when abstracts are not fetched
+        self.columns = ['paper_name', 'author', 'year', 'pdf_link', 'abstract']
+        # backend is 'csv', 'parquet' or any object with open()/write_rows(rows)/close()
+        if backend == 'csv':
+            backend = CsvBackend(csv_file, self.columns)
+        elif backend == 'parquet':
+            backend = ParquetBackend(os.path.splitext(csv_file)[0], self.columns, 'year', dictionary_columns=['author'])
+        self.backend = backend
+        # Optional SearchIndex that receives every flushed batch as well, so new papers are searchable mid-crawl
+        self.search_index = search_index
+        # Optional Telemetry that times every batch write as the 'metadata' and 'index' stages
+        self.telemetry = telemetry
+        # Optional callback(rows) once rows are safely in the backend, e.g. to mark them as recorded in the manifest;
+        # rows still queued or buffered when the process dies are never passed to it
+        self.on_flush = on_flush
+        # Rows are buffered and written by a single writer task, flushed every batch_size rows or flush_interval seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = None
+        self.writer_task = None
+        self._initialize_files()
+
+    def _initialize_files(self):
+        # Make sure the metadata directory exists; the backend creates its files when the writer starts
+        create_directory(os.path.dirname(os.path.abspath(self.csv_file)))
+
+    async def _writer(self):
+        # The only code that touches the backend, so concurrent papers can never interleave partial rows
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.backend.open)
+        if self.search_index is not None:
+            await loop.run_in_executor(None, self.search_index.open)
+        # Rows written to a backend that only persists them on close
+        unconfirmed = []
+        try:
+            closing = False
+            while not closing:
+                batch = [await self.queue.get()]
+                flush_at = loop.time() + self.flush_interval
+                while len(batch) < self.batch_size and batch[-1] is not None:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        remaining = flush_at - loop.time()
+                        if remaining <= 0:
+                            break
+                        try:
+                            batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                        except asyncio.TimeoutError:
+                            break
+                # None is the shutdown marker queued by close()
+                closing = batch[-1] is None
+                rows = batch[:-1] if closing else batch
+                if rows:
+                    await self._write_batch(loop, 'metadata', self.backend, rows)
+                    if self.search_index is not None:
+                        await self._write_batch(loop, 'index', self.search_index, rows)
+                    if getattr(self.backend, 'durable_writes', True):
+                        self._confirm(rows)
+                    else:
+                        unconfirmed += rows
+                for _ in batch:
+                    self.queue.task_done()
+        finally:
+            await loop.run_in_executor(None, self.backend.close)
+            self._confirm(unconfirmed)
+            if self.search_index is not None:
+                await loop.run_in_executor(None, self.search_index.close)
+
+    def _confirm(self, rows):
+        if rows and self.on_flush is not None:
+            self.on_flush(rows)
+
+    async def _write_batch(self, loop, stage, target, rows):
+        if self.telemetry is None:
+            return await loop.run_in_executor(None, target.write_rows, rows)
+        with self.telemetry.stage(stage, rows=len(rows)):
+            await loop.run_in_executor(None, target.write_rows, rows)
+
+    async def _enqueue_row(self, row):
+        if self.writer_task is None:
+            self.queue = asyncio.Queue(maxsize=self.batch_size * 4)
+            self.writer_task = asyncio.create_task(self._writer())
+        await self._put(row)
+
+    async def _put(self, item):
+        # The writer is the only consumer of the bounded queue: once it has died (e.g. disk full) nothing drains it
+        # again, so its error is raised here instead of blocking every producer forever
+        if self.writer_task.done():
+            self._raise_writer_error()
+        try:
+            self.queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+        put = asyncio.ensure_future(self.queue.put(item))
+        try:
+            await asyncio.wait([put, self.writer_task], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not put.done():
+                put.cancel()
+        if not put.done() or put.cancelled():
+            self._raise_writer_error()
+
+    def _raise_writer_error(self):
+        if not self.writer_task.cancelled() and self.writer_task.exception() is not None:
+            raise self.writer_task.exception()
+        raise RuntimeError("metadata writer stopped")
+
+    async def close(self):
+        # Flush whatever is still buffered, let the backend finalize its files and stop the writer
+        if self.writer_task is None:
+            return
+        if not self.writer_task.done():
+            try:
+                await self._put(None)
+            except Exception:
+                pass
+        writer_task, self.writer_task = self.writer_task, None
+        await writer_task
+
+    async def save_paper_metadata(self, paper_name, author, year, pdf_link, abstract=''):
+        paper_name = sanitize_filename(paper_name)
+        await self._enqueue_row([paper_name, author, year, pdf_link, abstract])
+
+
+async def verify_sha256(file_path, sha256) -> bool:
+    # Re-hashes a completed file off the event loop; reads the whole file, so layouts only do it when asked to
+    if not sha256:
+        return True
+    digest = await asyncio.get_running_loop().run_in_executor(None, sha256_file, file_path)
+    return digest.hexdigest() == sha256
+
+
+class FlatLayout:
+    # Original layout: every PDF is named after its sanitized title in one directory
+    def __init__(self, directory, verify=False):
+        self.directory = directory
+        # Re-hash completed files before skipping them (opt-in, see ContentAddressedStore)
+        self.verify_hashes = verify
+
+    def open(self):
+        create_directory(self.directory)
+
+    def path_for(self, pdf_url, paper_name, year):
+        return os.path.join(self.directory, f"{sanitize_filename(paper_name)}.pdf")
+
+    def commit(self, part_path, file_path, sha256, paper_name, year):
+        os.replace(part_path, file_path)
+        return file_path
+
+    async def verify(self, file_path, sha256) -> bool:
+        return not self.verify_hashes or await verify_sha256(file_path, sha256)
+
+    def close(self):
+        pass
+
+
+class ContentAddressedStore:
+    # PDFs live under objects/<aa>/<bb>/<hash>.pdf, keyed by the NeurIPS hash, so titles never collide and no directory
+    # grows large. Files with identical SHA-256 are stored once, and by-title/<year>/ holds human-readable symlinks
+    def __init__(self, directory, verify=False):
+        self.directory = directory
+        # Re-hash completed files before skipping them, so a corrupted file is downloaded again. Opt-in: it re-reads
+        # the whole archive on every rerun, while the manifest's size check alone is free
+        self.verify_hashes = verify
+        self.connection = None
+
+    def open(self):
+        if self.connection is not None:
+            return
+        create_directory(os.path.join(self.directory, 'objects'))
+        self.connection = sqlite3.connect(os.path.join(self.directory, 'index.sqlite'))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS papers (
+                paper_hash TEXT PRIMARY KEY,
+                title TEXT,
+                year TEXT,
+                path TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                link_path TEXT
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS papers_sha256 ON papers (sha256)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS papers_title ON papers (title)")
+        self.connection.commit()
+
+    def path_for(self, pdf_url, paper_name, year):
+        paper_hash = get_paper_hash(pdf_url)
+        return os.path.join(self.directory, 'objects', paper_hash[:2], paper_hash[2:4], f"{paper_hash}.pdf")
+
+    def commit(self, part_path, file_path, sha256, paper_name, year):
+        paper_hash = os.path.basename(file_path)[:-len('.pdf')]
+        duplicate = self.connection.execute("SELECT path FROM papers WHERE sha256 = ? AND path != ? LIMIT 1",
+                                            (sha256, file_path)).fetchone()
+        if duplicate is not None and os.path.exists(duplicate[0]):
+            try:
+                # Same bytes under another hash: keep one copy on disk and hard-link this path to it
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                os.link(duplicate[0], file_path)
+                os.remove(part_path)
+            except OSError:
+                os.replace(part_path, file_path)
+        else:
+            os.replace(part_path, file_path)
+        link_path = self._link(file_path, paper_name, year, paper_hash)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO papers (paper_hash, title, year, path, sha256, link_path) VALUES (?, ?, ?, ?, ?, ?)",
+            (paper_hash, paper_name, year, file_path, sha256, link_path))
+        self.connection.commit()
+        return file_path
+
+    def _link(self, file_path, paper_name, year, paper_hash):
+        link_directory = os.path.join(self.directory, 'by-title', str(year))
+        create_directory(link_directory)
+        title = sanitize_filename(paper_name) or paper_hash
+        link_path = os.path.join(link_directory, f"{title}.pdf")
+        owner = self.connection.execute("SELECT paper_hash FROM papers WHERE link_path = ?", (link_path,)).fetchone()
+        if owner is not None and owner[0] != paper_hash:
+            # Two papers with the same title in one year keep apart by a hash suffix
+            link_path = os.path.join(link_directory, f"{title} ({paper_hash[:8]}).pdf")
+        try:
+            if os.path.lexists(link_path):
+                os.remove(link_path)
+            os.symlink(os.path.relpath(file_path, link_directory), link_path)
+        except OSError:
+            # Symlinks may be unavailable (e.g. Windows without developer mode); the index still maps titles to files
+            return None
+        return link_path
+
+    def lookup(self, title):
+        # Title -> stored files, newest year first
+        rows = self.connection.execute("SELECT year, path FROM papers WHERE title = ? ORDER BY year DESC", (title,))
+        return [{"year": year, "path": path} for year, path in rows.fetchall()]
+
+    async def verify(self, file_path, sha256) -> bool:
+        return not self.verify_hashes or await verify_sha256(file_path, sha256)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class DownloadManifest:
+    # Persistent record of every PDF download, so interrupted or repeated runs only fetch the delta
+    def __init__(self, db_file='./metadata/manifest.sqlite'):
+        self.db_file = db_file
+        create_directory(os.path.dirname(os.path.abspath(db_file)))
+        self.connection = sqlite3.connect(db_file)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS downloads (
+                url TEXT PRIMARY KEY,
+                paper_hash TEXT NOT NULL,
+                year TEXT,
+                file_path TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                bytes INTEGER NOT NULL DEFAULT 0,
+                etag TEXT,
+                last_modified TEXT,
+                sha256 TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL,
+                remote_bytes INTEGER,
+                available INTEGER,
+                metadata_written INTEGER NOT NULL DEFAULT 0
+            )""")
+        # remote_bytes/available come from HEAD probes in metadata-only runs; older manifests lack them.
+        # metadata_written is set once the paper's metadata row was flushed; rows of older manifests were written
+        # together with their registration, so they count as written
+        columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(downloads)")}
+        for column in ("remote_bytes INTEGER", "available INTEGER", "metadata_written INTEGER NOT NULL DEFAULT 1"):
+            if column.split()[0] not in columns:
+                self.connection.execute(f"ALTER TABLE downloads ADD COLUMN {column}")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS downloads_paper_hash ON downloads (paper_hash)")
+        self.connection.commit()
+
+    def get(self, url):
+        row = self.connection.execute("SELECT * FROM downloads WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row else None
+
+    def is_complete(self, url, file_path) -> bool:
+        # A completed entry only counts if the file on disk still has the recorded size
+        entry = self.get(url)
+        return (entry is not None and entry["status"] == "complete" and os.path.exists(file_path)
+                and os.path.getsize(file_path) == entry["bytes"])
+
+    def register(self, url, year, file_path):
+        # metadata_written is explicit: in a migrated manifest the column defaults to 1
+        self.connection.execute(
+            "INSERT OR IGNORE INTO downloads (url, paper_hash, year, file_path, updated_at, metadata_written) "
+            "VALUES (?, ?, ?, ?, ?, 0)", (url, get_paper_hash(url), year, file_path, time.time()))
+        self.connection.commit()
+
+    def mark_metadata_written(self, urls):
+        self.connection.executemany("UPDATE downloads SET metadata_written = 1 WHERE url = ?", ((url,) for url in urls))
+        self.connection.commit()
+
+    def start_attempt(self, url):
+        self.connection.execute("UPDATE downloads SET attempts = attempts + 1, updated_at = ? WHERE url = ?",
+                                (time.time(), url))
+        self.connection.commit()
+
+    def update(self, url, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        self.connection.execute(f"UPDATE downloads SET {assignments} WHERE url = ?", (*fields.values(), url))
+        self.connection.commit()
+
+    def completed(self, start_year=None, end_year=None):
+        # Finished downloads in year order, e.g. for an export that should not rescan the download directory
+        sql = "SELECT * FROM downloads WHERE status = 'complete'"
+        params = []
+        if start_year is not None:
+            sql += " AND CAST(year AS INTEGER) >= ?"
+            params.append(int(start_year))
+        if end_year is not None:
+            sql += " AND CAST(year AS INTEGER) <= ?"
+            params.append(int(end_year))
+        for row in self.connection.execute(sql + " ORDER BY CAST(year AS INTEGER), paper_hash", params):
+            yield dict(row)
+
+    def close(self):
+        self.connection.close()
+
+
+class TextStore:
+    # Full text of every downloaded PDF keyed by NeurIPS hash; the SHA-256 of the PDF it came from tells whether the
+    # stored text is still current, so unchanged PDFs are never extracted twice
+    def __init__(self, db_file='./metadata/fulltext.sqlite'):
+        self.db_file = db_file
+        create_directory(os.path.dirname(os.path.abspath(db_file)))
+        self.connection = sqlite3.connect(db_file)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS texts (
+                paper_hash TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                title TEXT,
+                year TEXT,
+                pages INTEGER NOT NULL DEFAULT 0,
+                text TEXT NOT NULL DEFAULT '',
+                error TEXT,
+                extracted_at REAL
+            )""")
+        self.connection.commit()
+
+    def get(self, paper_hash):
+        row = self.connection.execute("SELECT * FROM texts WHERE paper_hash = ?", (paper_hash,)).fetchone()
+        return dict(row) if row else None
+
+    def is_current(self, paper_hash, sha256) -> bool:
+        # Failed extractions count as current too; only a changed PDF is worth another attempt
+        row = self.connection.execute("SELECT sha256 FROM texts WHERE paper_hash = ?", (paper_hash,)).fetchone()
+        return row is not None and bool(sha256) and row[0] == sha256
+
+    def save(self, paper_hash, sha256, title, year, pages=0, text='', error=None):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO texts (paper_hash, sha256, title, year, pages, text, error, extracted_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (paper_hash, sha256, title, year, pages, text, error, time.time()))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class YearSnapshots:
+    # Paper list of every year as of the last sync, so the next sync only fetches what was added or changed
+    def __init__(self, db_file='./metadata/snapshots.sqlite', changelog_file='./metadata/changelog.jsonl'):
+        self.db_file = db_file
+        self.changelog_file = changelog_file
+        create_directory(os.path.dirname(os.path.abspath(db_file)))
+        self.connection = sqlite3.connect(db_file)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS papers (
+                year TEXT NOT NULL,
+                paper_hash TEXT NOT NULL,
+                title TEXT,
+                author TEXT,
+                link TEXT,
+                PRIMARY KEY (year, paper_hash)
+            )""")
+        self.connection.commit()
+
+    def diff(self, year, paper_links):
+        # Added and changed (title or authors) papers in listing order, then the papers that disappeared
+        previous = {row["paper_hash"]: dict(row) for row in self.connection.execute(
+            "SELECT paper_hash, title, author, link FROM papers WHERE year = ?", (year,))}
+        changes = []
+        for paper_link in paper_links:
+            paper_hash = get_paper_hash(paper_link["link"])
+            entry = {"year": year, "paper_hash": paper_hash, "title": paper_link["title"],
+                     "author": paper_link["author"], "link": paper_link["link"]}
+            old = previous.pop(paper_hash, None)
+            if old is None:
+                changes.append({"change": "added", **entry})
+            elif (old["title"], old["author"]) != (paper_link["title"], paper_link["author"]):
+                changes.append({"change": "changed", **entry,
+                                "previous": {"title": old["title"], "author": old["author"]}})
+        changes += [{"change": "removed", "year": year, **old} for old in previous.values()]
+        return changes
+
+    def commit(self, year, paper_links, changes):
+        # Called only after the year's changes were fetched, so an interrupted sync is simply repeated next time
+        with self.connection:
+            self.connection.execute("DELETE FROM papers WHERE year = ?", (year,))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO papers (year, paper_hash, title, author, link) VALUES (?, ?, ?, ?, ?)",
+                [(year, get_paper_hash(paper_link["link"]), paper_link["title"], paper_link["author"], paper_link["link"])
+                 for paper_link in paper_links])
+        if changes:
+            synced_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+            with open(self.changelog_file, 'a', encoding='utf-8') as file:
+                for change in changes:
+                    file.write(json.dumps({"synced_at": synced_at, **change}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import aiohttp
+
+# Upper bounds (seconds) of the histogram buckets, from sub-millisecond parses to minute-long PDF downloads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def request_kind(url) -> str:
+    path = url.path if hasattr(url, 'path') else str(url)
+    if path.endswith('.pdf'):
+        return 'pdf'
+    if path.endswith('Abstract.html'):
+        return 'abstract'
+    if path.endswith('robots.txt'):
+        return 'robots'
+    return 'listing'
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, fraction):
+        # Upper bound of the bucket holding the quantile, so an estimate that errs on the slow side
+        if not self.count:
+            return 0.0
+        rank, seen = fraction * self.count, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+
+class Telemetry:
+    # Per-request HTTP timings (via an aiohttp TraceConfig), per-stage histograms and event-loop lag, exported as a
+    # JSON-lines event log and/or a Prometheus text file or endpoint. Code paths only call into it when a scraper
+    # was given one, so a run without telemetry pays nothing
+    def __init__(self, log_file=None, metrics_file=None, metrics_port=None, lag_interval=0.1, flush_interval=5.0,
+                 prefix='neurlps'):
+        self.log_file = log_file
+        self.metrics_file = metrics_file
+        self.metrics_port = metrics_port
+        self.lag_interval = lag_interval
+        self.flush_interval = flush_interval
+        self.prefix = prefix
+        # {(metric, sorted label items): Histogram / float}, plus gauges read only when metrics are rendered
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.log = None
+        self.tasks = []
+        self.metrics_runner = None
+
+    @staticmethod
+    def _key(metric, labels):
+        return metric, tuple(sorted(labels.items()))
+
+    def observe(self, metric, value, **labels):
+        key = self._key(metric, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def increment(self, metric, amount=1, **labels):
+        key = self._key(metric, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, metric, function, **labels):
+        # function() is called on every render, e.g. to report the limiter's current concurrency
+        self.gauges[self._key(metric, labels)] = function
+
+    def event(self, kind, /, **fields):
+        if self.log_file is None:
+            return
+        if self.log is None:
+            directory = os.path.dirname(os.path.abspath(self.log_file))
+            os.makedirs(directory, exist_ok=True)
+            self.log = open(self.log_file, 'a', encoding='utf-8')
+        self.log.write(json.dumps({"ts": round(time.time(), 6), "event": kind, **fields}, default=str) + "\n")
+
+    def record_stage(self, stage, seconds, **fields):
+        self.observe('stage_seconds', seconds, stage=stage)
+        self.event('stage', stage=stage, seconds=round(seconds, 6), **fields)
+
+    @contextmanager
+    def stage(self, stage, **fields):
+        # Wall time of the block, awaits included; works around both sync and async code
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, time.perf_counter() - started, **fields)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        # Splits every request into pool wait, DNS, connect (TCP + TLS) and time to response headers
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            context.started = time.perf_counter()
+            context.phase_starts = {}
+            context.phases = {}
+
+        def phase_start(name):
+            async def callback(session, context, params):
+                context.phase_starts[name] = time.perf_counter()
+            return callback
+
+        def phase_end(name):
+            async def callback(session, context, params):
+                if name in context.phase_starts:
+                    context.phases[name] = time.perf_counter() - context.phase_starts.pop(name)
+            return callback
+
+        def finish(context, method, url, status, error=None):
+            kind = request_kind(url)
+            phases = context.phases
+            ttfb = time.perf_counter() - context.started
+            for name, seconds in phases.items():
+                self.observe('http_phase_seconds', seconds, phase=name, kind=kind)
+            self.observe('http_phase_seconds', ttfb, phase='ttfb', kind=kind)
+            self.increment('http_requests_total', kind=kind, status=str(status) if status else 'error')
+            self.event('request', method=method, url=str(url), kind=kind, status=status, ttfb=round(ttfb, 6),
+                       error=error, **{name: round(seconds, 6) for name, seconds in phases.items()})
+
+        async def on_request_end(session, context, params):
+            finish(context, params.method, params.url, params.response.status)
+
+        async def on_request_exception(session, context, params):
+            finish(context, params.method, params.url, None, repr(params.exception))
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_queued_start.append(phase_start('queued'))
+        trace_config.on_connection_queued_end.append(phase_end('queued'))
+        trace_config.on_dns_resolvehost_start.append(phase_start('dns'))
+        trace_config.on_dns_resolvehost_end.append(phase_end('dns'))
+        trace_config.on_connection_create_start.append(phase_start('connect'))
+        trace_config.on_connection_create_end.append(phase_end('connect'))
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    async def start(self):
+        if self.tasks:
+            return
+        self.tasks.append(asyncio.create_task(self._sample_loop_lag()))
+        if self.metrics_file or self.log_file:
+            self.tasks.append(asyncio.create_task(self._flush_loop()))
+        if self.metrics_port:
+            await self._start_metrics_server()
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+            self.metrics_runner = None
+        self.flush()
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+    async def _sample_loop_lag(self):
+        # How late the loop wakes up from a short sleep: high values mean something is blocking it
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.observe('loop_lag_seconds', max(0.0, loop.time() - expected))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    async def _start_metrics_server(self):
+        # aiohttp's server side is only loaded when an endpoint is requested
+        from aiohttp import web
+
+        async def metrics(request):
+            return web.Response(text=self.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/metrics', metrics)
+        self.metrics_runner = web.AppRunner(app, access_log=None)
+        await self.metrics_runner.setup()
+        await web.TCPSite(self.metrics_runner, '0.0.0.0', self.metrics_port).start()
+
+    def flush(self):
+        if self.log is not None:
+            self.log.flush()
+        if self.metrics_file:
+            # Written next to the target and renamed, so a scraping collector never reads half a file
+            directory = os.path.dirname(os.path.abspath(self.metrics_file))
+            os.makedirs(directory, exist_ok=True)
+            temp_file = self.metrics_file + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                file.write(self.render_prometheus())
+            os.replace(temp_file, self.metrics_file)
+
+    @staticmethod
+    def _labels(label_items, extra=()):
+        items = [*label_items, *extra]
+        if not items:
+            return ''
+        return '{' + ','.join(f'{name}="{value}"' for name, value in items) + '}'
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for kind, metrics in (('counter', self.counters), ('gauge', self.gauges)):
+            for metric in sorted({metric for metric, _ in metrics}):
+                lines.append(f"# TYPE {self.prefix}_{metric} {kind}")
+                for (name, labels), value in sorted(metrics.items(), key=lambda item: item[0]):
+                    if name == metric:
+                        value = value() if callable(value) else value
+                        lines.append(f"{self.prefix}_{metric}{self._labels(labels)} {float(value or 0):g}")
+        for metric in sorted({metric for metric, _ in self.histograms}):
+            lines.append(f"# TYPE {self.prefix}_{metric} histogram")
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{self.prefix}_{metric}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.prefix}_{metric}_sum{self._labels(labels)} {histogram.total:.6f}")
+                lines.append(f"{self.prefix}_{metric}_count{self._labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        # Per histogram: count, total and mean seconds plus bucket-based p50/p99, e.g. for an end-of-run report
+        result = {}
+        for (metric, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+            name = metric + ''.join(f"[{value}]" for _, value in labels)
+            result[name] = {"count": histogram.count, "total": round(histogram.total, 4),
+                            "mean": round(histogram.total / histogram.count, 6) if histogram.count else 0.0,
+                            "p50": histogram.quantile(0.5), "p99": histogram.quantile(0.99)}
+        return result
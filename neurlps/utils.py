@@ -0,0 +1,54 @@
+import hashlib
+import os
+import re
+
+
+def create_directory(directory: str):
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+
+def sanitize_filename(filename: str) -> str:
+    # Replace invalid characters with an underscore
+    filename = re.sub(r'[\\/*?:"<>|]', '_', filename)
+    filename = re.sub(r"\\ ", repl='_', string=filename)
+    filename = re.sub(r'\t', '_', filename)  # Replace tab character with underscore
+    filename = re.sub(r'\n', '_', filename)
+    return filename
+
+
+def get_paper_hash(url: str) -> str:
+    # NeurIPS links end in '<hash>-Abstract.html' or '<hash>-Paper.pdf'
+    return url.rstrip('/').split('/')[-1].split('-')[0]
+
+
+def sha256_file(file_path: str, chunk_size=1024 * 1024):
+    # Hash an existing file in blocks; returns the hashlib object so callers can keep updating it
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(chunk_size), b''):
+            digest.update(block)
+    return digest
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def parse_bytes(value: str) -> float:
+    # '500K', '2.5MB', '1g' or a plain number of bytes, with the same 1024-based units as format_bytes
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([kmgt]?)i?b?\s*', value, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}")
+    return float(match.group(1)) * 1024 ** 'BKMGT'.index(match.group(2).upper() or 'B')
+
+
+def format_duration(seconds) -> str:
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
@@ -1,257 +1,50 @@
 import asyncio
-import csv
 import os
-import re
+import time
 from pathlib import Path
 
-import aiofiles
-import aiohttp
-import pandas as pd
-import requests
 import streamlit as st
-from bs4 import BeautifulSoup
 
-
-def create_directory(directory: str):
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-
-
-def sanitize_filename(filename: str) -> str:
-    # Replace invalid characters with an underscore
-    filename = re.sub(r'[\\/*?:"<>|]', '_', filename)
-    filename = re.sub(r"\\ ", repl='_', string=filename)
-    filename = re.sub(r'\t', '_', filename)  # Replace tab character with underscore
-    filename = re.sub(r'\n', '_', filename)
-    return filename
-
-
-def check_network_availability(url):
-    try:
-        requests.get(url)
-        return True
-    except requests.ConnectionError:
-        return False
+from neurlps import (BASE_URL, AdaptiveLimiter, DownloadManifest, HttpCache, MetadataStorage, NipsScrapper,
+                     ProgressTracker, SearchIndex, YearSnapshots, check_network_availability)
+from neurlps.utils import format_bytes, format_duration
 
 
 def get_absolute_path(relative_path):
     return Path(relative_path).resolve()
 
 
-class MetadataStorage:
-    def __init__(self, csv_file='metadata', csv_file_name='papers_metadata.csv'):
-        self.csv_file = get_absolute_path(csv_file)
-        self.csv_file_name = csv_file_name
-        self.loop = asyncio.get_event_loop()
-        self._initialize_files()
-
-    def _initialize_files(self):
-        # Initialize CSV file with headers if it doesn't exist
-        if not os.path.exists(self.csv_file):
-            os.makedirs(self.csv_file)
-        # Initialize the CSV file asynchronously
-        if not os.path.exists(self.csv_file):
-            self.loop.run_in_executor(None, self._initialize_csv)
-
-    def _initialize_csv(self):
-        # Initialize CSV file with headers if it doesn't exist
-        with open(self.csv_file, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Paper', 'Author', 'Year', 'PdfLink', 'Abstract'])
-
-    async def _append_to_csv(self, paper_name, author, year, pdf_link, abstract):
-        # Append paper metadata to CSV (using pandas)
-        df = pd.DataFrame([[paper_name, author, year, pdf_link, abstract]],
-                          columns=['Paper', 'Author', 'Year', 'PdfLink', 'Abstract'])
-        await self.loop.run_in_executor(None, self._write_to_csv, df)
-
-    def _write_to_csv(self, df):
-        # This function runs in a separate thread for non-blocking behavior
-        file_path = os.path.join(self.csv_file, self.csv_file_name)
-        if not os.path.exists(file_path):  # If the file does not exist, write the header
-            df.to_csv(file_path, mode='w', header=True, index=False, encoding='utf-8')
-        else:  # If the file exists, append without writing the header
-            df.to_csv(file_path, mode='a', header=False, index=False, encoding='utf-8')
-
-    async def save_paper_metadata(self, paper_name, author, year, pdf_link, abstract):
-        paper_name = sanitize_filename(paper_name)
-        await self._append_to_csv(paper_name, author, year, pdf_link, abstract)
-
-
-class ProgressTracker:
-    def __init__(self):
+class StreamlitProgressTracker(ProgressTracker):
+    # Same counters as the console tracker, rendered into Streamlit placeholders
+    def __init__(self, limiter=None, refresh_interval=1.0):
+        super().__init__(limiter=limiter, refresh_interval=refresh_interval)
         # UI Elements
         self.progress_bar = st.empty()
         self.year_progress_container = st.empty()
 
-        # Initialize progress tracking variables
-        self.total_papers = 0
-        self.downloaded_papers = 0
-        self.failed_papers = 0
-        self.year_stats = {}
-
-    def update(self, year, status):
-        if year not in self.year_stats:
-            self.year_stats[year] = {"downloaded": 0, "failed": 0, "total_papers": 0}
-
-        if status == "success":
-            self.downloaded_papers += 1
-            self.year_stats[year]["downloaded"] += 1
-        else:
-            self.failed_papers += 1
-            self.year_stats[year]["failed"] += 1
-        self.display_ui_progress()
-
-    def get_overall_progress(self):
-        return (self.downloaded_papers / self.total_papers) * 100 if self.total_papers > 0 else 0
-
-    def get_year_progress(self, year):
-        year_data = self.year_stats.get(year, {"downloaded": 0, "total_papers": 0})
-        year_progress = (year_data["downloaded"] / year_data["total_papers"]) * 100 if year_data[
-                                                                                           "total_papers"] > 0 else 0
-        return year_progress
-
-    def display_ui_progress(self):
+    def display_progress(self):
         overall_progress = self.get_overall_progress() / 100
         progress_msg = f"Overall Progress : {self.get_overall_progress():.2f}%"
-        overall_papers_status = f"Papers Total: {self.total_papers}  | Downloaded: {self.downloaded_papers}  | Failed: {self.failed_papers}"
+        overall_papers_status = (f"Papers Total: {self.total_papers}  | Downloaded: {self.downloaded_papers}  | "
+                                 f"Failed: {self.failed_papers}  | {format_bytes(self.bytes_per_second)}/s  | "
+                                 f"ETA {format_duration(self.get_eta())}")
+        if self.limiter is not None:
+            overall_papers_status += f"  | Concurrency: {self.limiter.current_limit}"
 
-        self.progress_bar.progress(value=overall_progress, text=progress_msg)
+        self.progress_bar.progress(value=min(overall_progress, 1.0), text=progress_msg)
 
         with self.year_progress_container.container():
             st.warning(overall_papers_status)
             st.write("Year-wise Progress")
             year_progress = ""
             for year, stats in self.year_stats.items():
-                year_progress += f"Year {year}: {stats['downloaded']}/{stats['total_papers']} \n"
+                year_progress += f"Year {year}: {stats['downloaded']}/{stats['total_papers']}"
+                if stats["in_flight"] > 0:
+                    year_progress += f" ({stats['in_flight']} in flight)"
+                year_progress += " \n"
             st.code(year_progress)
 
 
-class NipsScrapper:
-    def __init__(self, base_url, download_directory, semaphore, progress_tracker: ProgressTracker,
-                 metadata_storage: MetadataStorage):
-        self.base_url = base_url
-        self.download_directory = download_directory
-        self.semaphore = semaphore
-        self.progress_tracker = progress_tracker
-        self.metadata_storage = metadata_storage
-
-    async def download_paper(self, session, pdf_url: str, save_directory: str, paper_name: str, year):
-        try:
-            paper_name = sanitize_filename(paper_name)
-            async with session.get(pdf_url) as response:
-                response.raise_for_status()
-                # Create the full path to save the PDF
-                file_path = os.path.join(save_directory, fr"{paper_name}.pdf")
-                # Write the PDF to the file asynchronously
-                async with aiofiles.open(file_path, 'wb') as file:
-                    await file.write(await response.read())
-                self.progress_tracker.update(year, "success")
-            return {"status": "success", "file_name": f"{paper_name}.pdf", "url": pdf_url, "year": year}
-        except aiohttp.ClientError as e:
-            print(f"Failed to download {paper_name}: {e}")
-            self.progress_tracker.update(year, "failed")
-            return {"status": "failed", "file_name": "", "url": pdf_url, "year": year}
-
-    async def get_paper_abstract(self, paper_web_link, session) -> str:
-        try:
-            async with session.get(paper_web_link) as response:
-                response.raise_for_status()
-                soup = BeautifulSoup(await response.text(), 'html.parser')
-                abstract = ''
-                abstract_paras = soup.select('body > div.container-fluid > div > p')
-                if abstract_paras:
-                    abstract = abstract_paras[2].text
-                    # st.code(f"Abstract Para : {abstract}")
-                return abstract
-        except Exception as e:
-            print(f"Failed to extract Abstract  from {paper_web_link}: {e}")
-        return ''
-
-    async def extract_paper_links(self, session, page_url: str):
-        try:
-            paper_links = []
-            async with session.get(page_url) as response:
-                response.raise_for_status()
-                soup = BeautifulSoup(await response.text(), 'html.parser')
-
-                # Find all links for papers (filter by 'Paper' text)
-                selected_a_tags = soup.select("body > div.container-fluid > div > ul > li a")
-                for a in selected_a_tags:
-                    link = a.get('href')
-                    title = a.get_text()
-                    author = a.find_next_sibling('i').get_text()
-                    paper_links.append({
-                        "title": title,
-                        "link": link,
-                        "author": author
-                    })
-            return paper_links
-        except aiohttp.ClientError as e:
-            print(f"Failed to extract paper links from {page_url}: {e}")
-            return {}
-
-    async def extract_year_links(self, session, sub_link_url: str) -> list[str]:
-        try:
-            async with session.get(sub_link_url) as response:
-                response.raise_for_status()
-                soup = BeautifulSoup(await response.text(), 'html.parser')
-
-                year_links = [
-                    a.get('href') for a in soup.find_all('a') if 'paper_files/paper/' in a.get('href')
-                ]
-                return year_links
-        except aiohttp.ClientError as e:
-            print(f"Failed to extract year links from {sub_link_url}: {e}")
-            return []
-
-    async def get_max_min_year(self) -> (int, int):
-        # Extract all year-wise sub-links
-        async with aiohttp.ClientSession() as session:
-            year_links = await self.extract_year_links(session, self.base_url)
-            # st.code(f"Years : {year_links}")
-            return int(year_links[0].split('/')[-1]), int(year_links[-1].split('/')[-1])
-
-    def convert_to_pdf_url(self, abstract_url: str) -> str:
-        return abstract_url.replace('hash/', 'file/').replace("Abstract", "Paper").replace('.html', '.pdf')
-
-    async def download_papers_from_year_range(self, start_year, end_year):
-        create_directory(self.download_directory)
-        async with aiohttp.ClientSession() as session:
-            year_links = await self.extract_year_links(session, self.base_url)
-            tasks = []  # List to store all download tasks
-            for year_link in year_links:
-                year = year_link.split('/')[-1]
-                if start_year <= int(year) <= end_year:
-                    full_year_url = self.base_url + year_link
-                    paper_links_extracted = await self.extract_paper_links(session, full_year_url)
-                    total_papers_in_year = len(paper_links_extracted)
-                    self.progress_tracker.total_papers += total_papers_in_year
-
-                    self.progress_tracker.year_stats[year] = {
-                        "total_papers": total_papers_in_year,
-                        "downloaded": 0,
-                        "failed": 0,
-                    }
-
-                    for paper_link in paper_links_extracted:
-                        pdf_link = self.convert_to_pdf_url(paper_link["link"])
-                        paper_name = paper_link["title"]
-                        author = paper_link["author"]
-                        paper_abstract = await self.get_paper_abstract(self.base_url + paper_link["link"], session)
-                        tasks.append(self.download_paper_with_semaphore(session, self.base_url + pdf_link, paper_name,
-                                                                        year,
-                                                                        author, paper_abstract))
-
-            await asyncio.gather(*tasks)
-
-    async def download_paper_with_semaphore(self, session, pdf_url: str, paper_name: str, year, author, abstract):
-        async with self.semaphore:
-            await self.metadata_storage.save_paper_metadata(paper_name=paper_name, author=author, year=year,
-                                                            pdf_link=pdf_url, abstract=abstract)
-            return await self.download_paper(session, pdf_url, self.download_directory, paper_name, year)
-
-
 def init_ui():
     # Streamlit setup
     st.set_page_config(
@@ -287,43 +80,100 @@ def get_paths(csv_path, download_directory):
     return folder_path, csv_path
 
 
+def search_panel(index_file):
+    # Queries the on-disk FTS5 index the crawls maintain, so results come back in milliseconds without loading the CSV
+    st.header("Search Papers")
+    query = st.text_input("Search titles, authors and abstracts: ", placeholder="e.g. graph neural networks")
+    year = st.text_input("Year (optional): ", placeholder="any year").strip() or None
+    if not query:
+        return
+    if not os.path.exists(index_file):
+        st.info("No search index yet, download some papers first.")
+        return
+    search_index = SearchIndex(index_file)
+    try:
+        started = time.perf_counter()
+        results = search_index.search(query, limit=50, year=year, highlight=('**', '**'))
+        st.caption(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.1f} ms")
+    finally:
+        search_index.close()
+    for result in results:
+        title = f"[{result['title']}]({result['pdf_link']})" if result['pdf_link'] else result['title']
+        st.markdown(f"{title} ({result['year']})  \n_{result['author']}_  \n{result['snippet']}")
+
+
 async def main():
     try:
 
         log_container = init_ui()
         # Scraper setup
-        base_url = "https://papers.nips.cc"  # The correct base URL for your target website
+        base_url = BASE_URL
         download_directory = r"downloaded_papers"
         csv_path = r"metadata"
         csv_file_name = "papers_metadata.csv"
-        if not check_network_availability(base_url):
+        # Offline mode answers every listing/abstract page from the local cache and never touches the network
+        offline_mode = log_container.checkbox("Offline mode (cached pages only)")
+        if not offline_mode and not await check_network_availability(base_url):
             if st.button("Reload"):
                 st.rerun()
             log_container.error("Unable to access Site, Please check your internet connection and try again.")
             return
-        semaphore = asyncio.Semaphore(50)
-        progress_tracker = ProgressTracker()
+        # Starts low and adapts to what the link and server sustain instead of a fixed 50
+        limiter = AdaptiveLimiter(initial_limit=10, max_limit=100)
+        progress_tracker = StreamlitProgressTracker(limiter=limiter)
         # Initialize MetadataStorage
         with log_container.container():
             download_directory, csv_path = get_paths(csv_path, download_directory)
+            search_index_file = os.path.join(get_absolute_path(csv_path), 'search.sqlite')
+            with st.sidebar:
+                search_panel(search_index_file)
             # st.write(f"Path is {download_directory}")
-            metadata_storage = MetadataStorage(csv_file=csv_path, csv_file_name=csv_file_name)
+            metadata_format = st.selectbox("Metadata Format: ", options=['csv', 'parquet'])
+            metadata_storage = MetadataStorage(os.path.join(get_absolute_path(csv_path), csv_file_name),
+                                               backend=metadata_format, search_index=SearchIndex(search_index_file))
+            manifest = DownloadManifest(os.path.join(get_absolute_path(csv_path), 'manifest.sqlite'))
+            http_cache = HttpCache(os.path.join(get_absolute_path(csv_path), 'http_cache.sqlite'),
+                                   cache_only=offline_mode)
+            # 'hashed' stores PDFs by NeurIPS hash with deduplication and by-title symlinks instead of one flat folder
+            layout = st.selectbox("PDF Layout: ", options=['flat', 'hashed'])
+            # Sync mode only fetches papers added or changed since the last sync and appends them to the changelog
+            sync_mode = st.checkbox("Only fetch papers new or changed since the last sync")
+            snapshots = YearSnapshots(os.path.join(get_absolute_path(csv_path), 'snapshots.sqlite'),
+                                      os.path.join(get_absolute_path(csv_path), 'changelog.jsonl'))
             nips_scrapper = NipsScrapper(base_url, get_absolute_path(os.path.join(download_directory, 'docs')),
-                                         semaphore,
-                                         progress_tracker, metadata_storage)
-            max_year, min_year = await nips_scrapper.get_max_min_year()
-            start_year, end_year = get_inputs(max_year, min_year)
-            if st.button("Start Downloading"):
-                if start_year < min_year or end_year > max_year:
-                    st.toast(f"Please Enter Year between {min_year} and {max_year}, Please try again")
-                    st.rerun()
-                else:
-                    log_container.success(
-                        f"Downloading : {(end_year - start_year) + 1} years Papers from {start_year} to {end_year}, Please wait...")
-                    # Start downloading papers
-                    with st.spinner():
-                        await nips_scrapper.download_papers_from_year_range(start_year, end_year)
-                    log_container.toast(f" ✅ Download Completed.")
+                                         limiter,
+                                         progress_tracker, metadata_storage, manifest=manifest,
+                                         http_cache=http_cache, layout=layout, snapshots=snapshots,
+                                         fetch_abstracts=True)
+            try:
+                years = await nips_scrapper.get_max_min_year()
+                if years is None:
+                    log_container.error("Unable to read the list of years from the site or the offline cache.")
+                    return
+                max_year, min_year = years
+                start_year, end_year = get_inputs(max_year, min_year)
+                if st.button("Start Downloading"):
+                    if start_year < min_year or end_year > max_year:
+                        st.toast(f"Please Enter Year between {min_year} and {max_year}, Please try again")
+                        st.rerun()
+                    else:
+                        log_container.success(
+                            f"Downloading : {(end_year - start_year) + 1} years Papers from {start_year} to {end_year}, Please wait...")
+                        # Start downloading papers
+                        with st.spinner():
+                            changes = await nips_scrapper.download_papers_from_year_range(start_year, end_year,
+                                                                                           sync=sync_mode)
+                        log_container.toast(f" ✅ Download Completed.")
+                        if sync_mode:
+                            log_container.info(
+                                f"Sync: {sum(change['change'] == 'added' for change in changes)} added, "
+                                f"{sum(change['change'] == 'changed' for change in changes)} changed, "
+                                f"{sum(change['change'] == 'removed' for change in changes)} removed")
+            finally:
+                await nips_scrapper.close()
+                manifest.close()
+                http_cache.close()
+                snapshots.close()
     except Exception as e:
         st.error(f"Error : {e}")
 
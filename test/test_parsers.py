@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from neurlps.parsers import parse_abstract, parse_paper_links, parse_year_links
+
+pytest.importorskip('lxml')
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+# Saved papers.nips.cc-style pages and the parser that reads each of them
+CASES = [
+    ('index.html', parse_year_links),
+    ('year_listing.html', parse_paper_links),
+    ('year_listing_edge_cases.html', parse_paper_links),
+    ('abstract.html', parse_abstract),
+    ('abstract_missing.html', parse_abstract),
+]
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize('name, parse_function', CASES)
+def test_lxml_matches_bs4(name, parse_function):
+    html = read_fixture(name)
+    assert parse_function(html, 'lxml') == parse_function(html, 'bs4')
+
+
+@pytest.mark.parametrize('name, parse_function', CASES)
+def test_process_pool_matches_inline(name, parse_function):
+    # NipsScrapper.parse hands the same module-level functions to a parse_executor
+    html = read_fixture(name)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        for parser in ('lxml', 'bs4'):
+            assert executor.submit(parse_function, html, parser).result() == parse_function(html, parser)
+
+
+def test_year_links():
+    links = parse_year_links(read_fixture('index.html'), 'lxml')
+    assert links[:4] == ['/paper_files/paper/2023', '/paper_files/paper/2022', '/paper_files/paper/1988',
+                         '/paper_files/paper/1987']
+
+
+def test_paper_links_edge_cases():
+    papers = parse_paper_links(read_fixture('year_listing_edge_cases.html'), 'lxml')
+    # The link outside the paper list container is not picked up
+    assert len(papers) == 6
+    assert papers[0]["title"] == 'Learning & Generalization in Naïve Nets: “Why” It’s Hard'
+    assert papers[0]["author"] == 'René Descartes, Jürgen Schmidhuber & Co.'
+    assert papers[1]["author"] == ''
+    assert papers[2]["title"] == 'Fast O(n log n) Training of H2 Networks'
+    assert papers[2]["author"] == 'Claude Shannon, Norbert Wiener'
+    assert papers[3]["author"] == ''
+    assert papers[5]["author"] == 'Jan Łukasiewicz'
+
+
+def test_abstract():
+    abstract = parse_abstract(read_fixture('abstract.html'), 'lxml')
+    assert abstract.startswith('We revisit self-attention and show that transformers with O(n2) cost still win —')
+    assert '<all>' in abstract
+    assert parse_abstract(read_fixture('abstract_missing.html'), 'lxml') == ''